@@ -0,0 +1,256 @@
+import re
+import json
+import time
+import queue
+import threading
+from collections import Counter
+
+from library import WORD_RE, SEARCH_STEM_LENGTH
+
+# Настройки дайджестов
+SUMMARY_SENTENCES = 4           # предложений в извлекающем пересказе главы
+SUMMARY_MAX_CHARS = 800
+MODEL_SECTION_CHARS = 30000     # сколько текста главы отдавать модели для пересказа
+ROUTE_SECTION_CHARS = 12000     # сколько текста главы добавлять к ответу
+ROUTE_SECTIONS = 3
+TERMS_PER_SECTION = 40
+
+# Заголовки: "Том первый", "Глава 3", "ГЛАВА XI", "Часть вторая" и т. п. на отдельной строке
+HEADING_RE = re.compile(
+    r"^[ \t]*((?:том|книга|часть|глава|раздел)[ \t]+[\w.-]+)[ \t]*\.?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE,
+)
+# "глава 3", "в главе XI" и "в третьей главе", "3-я глава"
+CHAPTER_AFTER_RE = re.compile(r"глав\w*\s+(\d+|[ivxlc]+\b|[а-яё]+)", re.IGNORECASE)
+CHAPTER_BEFORE_RE = re.compile(r"(\d+|[а-яё]+)[-\w]*\s+глав", re.IGNORECASE)
+SENTENCE_RE = re.compile(r"[^.!?…]+[.!?…]+", re.UNICODE)
+
+ORDINALS = (
+    ('одиннадцат', 11), ('двенадцат', 12), ('тринадцат', 13), ('четырнадцат', 14), ('пятнадцат', 15),
+    ('перв', 1), ('втор', 2), ('трет', 3), ('четв', 4), ('пят', 5), ('шест', 6),
+    ('седьм', 7), ('восьм', 8), ('девят', 9), ('десят', 10),
+)
+ROMAN = {'i': 1, 'v': 5, 'x': 10, 'l': 50, 'c': 100}
+
+SUMMARY_PROMPT = """Кратко (3-5 предложений) перескажи этот фрагмент книги: кто участвует и что происходит.
+
+{text}"""
+
+SQL_SECTIONS = "SELECT seq, title, start, end, summary FROM digest_sections WHERE blob_id = ? ORDER BY seq"
+SQL_TERM_SECTIONS = """
+    SELECT seq, sum(count) AS hits FROM digest_terms
+    WHERE blob_id = ? AND term IN (SELECT value FROM json_each(?))
+    GROUP BY seq ORDER BY hits DESC LIMIT ?
+"""
+
+
+def parse_number(word):
+    """
+    Номер главы из "3", "XI" или порядкового числительного ("третья").
+    """
+    word = word.lower()
+    if word.isdigit():
+        return int(word)
+    if word and all(ch in ROMAN for ch in word):
+        total = 0
+        for i, ch in enumerate(word):
+            value = ROMAN[ch]
+            total += -value if i + 1 < len(word) and ROMAN[word[i + 1]] > value else value
+        return total
+    for stem, number in ORDINALS:
+        if word.startswith(stem):
+            return number
+    return None
+
+
+def build_outline(text):
+    """
+    Находит заголовки томов/частей/глав и возвращает список разделов
+    (название, начало, конец). Текст без заголовков — один раздел.
+    """
+    matches = list(HEADING_RE.finditer(text))
+    if not matches:
+        return [("Весь текст", 0, len(text))]
+    sections = []
+    if text[:matches[0].start()].strip():
+        sections.append(("Начало", 0, matches[0].start()))
+    prefix = None
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        title, start = match.group(1).strip(), match.start()
+        if prefix:
+            title, start = f"{prefix[0]}. {title}", prefix[1]
+            prefix = None
+        # Заголовок без текста ("Том первый" перед "Глава первая") объединяем со следующим
+        if i + 1 < len(matches) and not text[match.end():end].strip():
+            prefix = (title, start)
+            continue
+        sections.append((title, start, end))
+    return sections
+
+
+def stem(word):
+    return word.lower().replace('ё', 'е')[:SEARCH_STEM_LENGTH]
+
+
+def name_terms(text):
+    """
+    Частые имена собственные раздела: слова с заглавной буквы, которые
+    в тексте не встречаются со строчной (отсекает начала предложений).
+    """
+    upper = Counter()
+    lower = set()
+    for word in WORD_RE.findall(text):
+        if len(word) < 4 or word.isdigit():
+            continue
+        if word[0].isupper():
+            upper[stem(word)] += 1
+        else:
+            lower.add(stem(word))
+    return Counter({term: n for term, n in upper.items() if term not in lower})
+
+
+def extractive_summary(text, sentences=SUMMARY_SENTENCES, max_chars=SUMMARY_MAX_CHARS):
+    """
+    Пересказ без модели: предложения с наибольшим весом частых слов раздела,
+    в порядке следования в тексте.
+    """
+    # Реплики диалога плохо пересказывают сюжет, берём повествование
+    found = [s.strip() for s in SENTENCE_RE.findall(text)
+             if len(s.split()) >= 8 and not s.strip().startswith(('—', '-'))]
+    if not found:
+        return text[:max_chars].strip()
+    freq = Counter(stem(w) for w in WORD_RE.findall(text) if len(w) > 3)
+
+    def weight(sentence):
+        words = [stem(w) for w in WORD_RE.findall(sentence) if len(w) > 3]
+        return sum(freq[w] for w in words) / (len(words) + 1) ** 0.5
+
+    best = sorted(sorted(range(len(found)), key=lambda i: -weight(found[i]))[:sentences])
+    summary = ' '.join(found[i] for i in best)
+    return summary[:max_chars]
+
+
+def build_digest(library, blob_id, text, summarize=None):
+    """
+    Строит оглавление, пересказы разделов и указатель имён для текста и
+    сохраняет их в базу. summarize(text) -> str; по умолчанию пересказ без модели.
+    """
+    sections = build_outline(text)
+    section_rows = []
+    term_rows = []
+    for seq, (title, start, end) in enumerate(sections):
+        body = text[start:end]
+        summary = None
+        if summarize is not None:
+            try:
+                summary = summarize(body[:MODEL_SECTION_CHARS])
+            except Exception as e:
+                print(f"Не удалось пересказать раздел '{title}' моделью: {e}")
+        section_rows.append((blob_id, seq, title, start, end, summary or extractive_summary(body)))
+        term_rows.extend((blob_id, term, seq, n) for term, n in name_terms(body).most_common(TERMS_PER_SECTION))
+
+    with library.transaction() as conn:
+        conn.execute("DELETE FROM digest_sections WHERE blob_id = ?", (blob_id,))
+        conn.execute("DELETE FROM digest_terms WHERE blob_id = ?", (blob_id,))
+        conn.executemany("INSERT INTO digest_sections (blob_id, seq, title, start, end, summary) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", section_rows)
+        conn.executemany("INSERT INTO digest_terms (blob_id, term, seq, count) VALUES (?, ?, ?, ?)", term_rows)
+        conn.execute("INSERT OR REPLACE INTO digests (blob_id, created) VALUES (?, ?)", (blob_id, time.time()))
+    return len(section_rows)
+
+
+def model_summarizer(backend):
+    return lambda text: backend.generate(SUMMARY_PROMPT.format(text=text))
+
+
+def start_worker(library, mode, backend=None):
+    """
+    Запускает фоновое построение дайджестов. mode: 'off' — не строить,
+    'extractive' — пересказы без модели, 'model' — пересказы моделью через backend.
+    """
+    if mode == 'off':
+        return None
+    if mode == 'model':
+        return DigestWorker(library, model_summarizer(backend))
+    return DigestWorker(library)
+
+
+class DigestWorker:
+    """
+    Фоновый поток, который строит дайджесты добавленных книг, не задерживая импорт.
+    """
+
+    def __init__(self, library, summarize=None):
+        self.library = library
+        self.summarize = summarize
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def schedule(self, book_id):
+        self.queue.put(book_id)
+
+    def _run(self):
+        while True:
+            book_id = self.queue.get()
+            try:
+                if book_id is None:
+                    return
+                blob_id = self.library.book_blob(book_id)
+                if blob_id is not None and not self.library.has_digest(blob_id):
+                    build_digest(self.library, blob_id, self.library.get_book_text(book_id), self.summarize)
+            except Exception as e:
+                print(f"Ошибка при построении дайджеста книги {book_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def close(self, wait=True):
+        """
+        Останавливает поток; при wait=True сначала дожидается всех поставленных книг.
+        """
+        if wait:
+            self.queue.join()
+        self.queue.put(None)
+        if wait:
+            self.thread.join()
+
+
+def route_question(library, book_id, question):
+    """
+    Подбирает контекст по дайджесту: для "что в главе N" — пересказ и текст
+    главы, для вопросов об именах — пересказы и текст разделов, где имя
+    встречается чаще всего. Возвращает None, если дайджеста нет или
+    вопрос не подходит ни под один случай.
+    """
+    blob_id = library.book_blob(book_id)
+    if blob_id is None or not library.has_digest(blob_id):
+        return None
+    sections = library.conn.execute(SQL_SECTIONS, (blob_id,)).fetchall()
+
+    chosen = []
+    words = [m.group(1) for pattern in (CHAPTER_AFTER_RE, CHAPTER_BEFORE_RE) for m in pattern.finditer(question)]
+    number = next((n for n in map(parse_number, words) if n), None)
+    if number:
+        for section in sections:
+            words = WORD_RE.findall(section[1])
+            idx = next((i for i, w in enumerate(words) if w.lower().startswith('глав')), None)
+            if idx is not None and idx + 1 < len(words) and parse_number(words[idx + 1]) == number:
+                chosen.append(section)
+                break
+    if not chosen:
+        # Вопросительные слова с заглавной буквы в указатель имён не попадают, их можно не отсеивать
+        names = [stem(w) for w in WORD_RE.findall(question) if w[0].isupper() and len(w) >= 4]
+        if names:
+            ranked = library.conn.execute(SQL_TERM_SECTIONS, (blob_id, json.dumps(names), ROUTE_SECTIONS)).fetchall()
+            by_seq = {section[0]: section for section in sections}
+            chosen = sorted(by_seq[seq] for seq, _ in ranked if seq in by_seq)
+    if not chosen:
+        return None
+
+    parts = ["Оглавление: " + "; ".join(section[1] for section in sections)]
+    budget = ROUTE_SECTION_CHARS // len(chosen)
+    for seq, title, start, end, summary in chosen:
+        text = library.read_range(book_id, start, min(end, start + budget))
+        parts.append(f"[{title}, символы {start}-{end}]\nКраткое содержание: {summary}\n\nТекст:\n{text.strip()}")
+    return "\n\n".join(parts)
@@ -0,0 +1,215 @@
+import os
+import sys
+import glob
+import json
+import time
+import codecs
+import fnmatch
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from library import BookLibrary, prepare_book, DB_PATH
+from digests import start_worker
+from models import make_backend
+
+try:
+    import charset_normalizer
+except ImportError:
+    charset_normalizer = None
+
+# Настройки массового импорта
+BOOK_EXTENSIONS = ('.txt', '.text')
+DEFAULT_WORKERS = 8
+DEFAULT_BATCH = 200
+# Однобайтовые кириллические кодировки, из которых выбираем, если текст не UTF-8
+FALLBACK_ENCODINGS = ('cp1251', 'koi8-r', 'cp866')
+FREQUENT_LETTERS = set('оеаинтсрвлкм ')
+
+
+def decode_text(raw):
+    """
+    Определяет кодировку файла и возвращает (текст, кодировка).
+    """
+    if raw.startswith(codecs.BOM_UTF8):
+        return raw[len(codecs.BOM_UTF8):].decode('utf-8'), 'utf-8-sig'
+    if raw.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return raw.decode('utf-16'), 'utf-16'
+    try:
+        return raw.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    if charset_normalizer is not None:
+        best = charset_normalizer.from_bytes(raw).best()
+        if best is not None:
+            return str(best), best.encoding
+
+    # Неверная однобайтовая кодировка даёт "кракозябры" с редкими буквами,
+    # поэтому выбираем вариант с наибольшей долей частых строчных букв
+    def score(encoding):
+        sample = raw[:20000].decode(encoding, errors='replace')
+        return sum(1 for ch in sample if ch in FREQUENT_LETTERS)
+
+    encoding = max(FALLBACK_ENCODINGS, key=score)
+    return raw.decode(encoding, errors='replace'), encoding
+
+
+def find_files(patterns):
+    """
+    Раскрывает каталоги и glob-шаблоны в отсортированный список файлов книг.
+    """
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                files.update(os.path.join(root, name) for name in names if name.lower().endswith(BOOK_EXTENSIONS))
+        else:
+            files.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(os.path.abspath(path) for path in files)
+
+
+def category_for(path, mapping, default):
+    """
+    Категория берётся из первого подходящего шаблона, иначе — default,
+    иначе — имя каталога, в котором лежит файл.
+    """
+    for pattern, category in mapping:
+        if fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(os.path.basename(path), pattern):
+            return category
+    return default or os.path.basename(os.path.dirname(path))
+
+
+def load_book(path, category):
+    """
+    Читает, декодирует и готовит книгу к записи (выполняется в пуле потоков).
+    """
+    stat = os.stat(path)
+    with open(path, 'rb') as file:
+        raw = file.read()
+    text, encoding = decode_text(raw)
+    text = text.replace('\r\n', '\n')
+    title = os.path.splitext(os.path.basename(path))[0]
+    book = prepare_book(title, category, text, source=path, size=stat.st_size, mtime=stat.st_mtime)
+    book['encoding'] = encoding
+    return book
+
+
+def run_import(library, files, mapping=(), default_category=None, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH,
+               digests=None):
+    """
+    Импортирует файлы пачками: пока одна пачка пишется в базу, следующая уже читается.
+    Каждая пачка — одна транзакция вместе с журналом импорта, поэтому прерванный
+    импорт можно просто запустить заново: уже записанные файлы будут пропущены.
+    """
+    imported = library.imported_files()
+    todo = []
+    for path in files:
+        stat = os.stat(path)
+        if imported.get(path) != (stat.st_size, stat.st_mtime):
+            todo.append(path)
+    skipped = len(files) - len(todo)
+    if skipped:
+        print(f"Пропущено уже импортированных файлов: {skipped}")
+    if not todo:
+        print("Нечего импортировать.")
+        return 0
+
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    started = time.perf_counter()
+    done = 0
+    failed = 0
+    duplicates = 0
+    replaced = 0
+    total_bytes = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        def submit(batch):
+            return [(path, pool.submit(load_book, path, category_for(path, mapping, default_category))) for path in batch]
+
+        upcoming = submit(batches[0])
+        for index in range(len(batches)):
+            current = upcoming
+            upcoming = submit(batches[index + 1]) if index + 1 < len(batches) else []
+
+            books = []
+            for path, future in current:
+                try:
+                    books.append(future.result())
+                except Exception as e:
+                    failed += 1
+                    print(f"Ошибка при чтении {path}: {e}")
+            ids = library.add_books(books)
+            if digests:
+                for book_id in ids:
+                    digests.schedule(book_id)
+            duplicates += sum(1 for book in books if book['dedup'])
+            replaced += sum(1 for book in books if book['replaced'])
+
+            done += len(current)
+            total_bytes += sum(book['file_size'] for book in books)
+            elapsed = time.perf_counter() - started
+            print(f"{done}/{len(todo)} файлов, {done / elapsed:.1f} файлов/с, "
+                  f"{total_bytes / elapsed / 1e6:.2f} МБ/с")
+
+    elapsed = time.perf_counter() - started
+    print(f"Импорт завершён за {elapsed:.1f} с: добавлено {done - failed} "
+          f"(из них дубликатов уже сохранённых текстов: {duplicates}, обновлено изменившихся файлов: {replaced}), "
+          f"ошибок {failed}.")
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Массовый импорт книг в библиотеку.")
+    parser.add_argument('paths', nargs='*', help="каталоги или glob-шаблоны файлов (*.txt, *.text)")
+    parser.add_argument('--db', default=DB_PATH, help="файл базы данных")
+    parser.add_argument('--category', default=None, help="категория по умолчанию (иначе — имя каталога)")
+    parser.add_argument('--map', action='append', default=[], metavar='ШАБЛОН=КАТЕГОРИЯ',
+                        help="назначить категорию файлам по шаблону, можно указывать несколько раз")
+    parser.add_argument('--map-file', default=None, help="JSON-файл {\"шаблон\": \"категория\"}")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="потоков для чтения файлов")
+    parser.add_argument('--batch', type=int, default=DEFAULT_BATCH, help="файлов в одной транзакции")
+    parser.add_argument('--digests', choices=('off', 'extractive', 'model'), default=os.getenv("BOOK_DIGESTS", "off"),
+                        help="строить в фоне оглавления, пересказы глав и указатель имён")
+    parser.add_argument('--backfill-digests', action='store_true',
+                        help="построить дайджесты и для книг, добавленных раньше без них "
+                             "(при --digests off — без модели, как extractive)")
+    args = parser.parse_args(argv)
+    if not args.paths and not args.backfill_digests:
+        parser.error("укажите файлы для импорта или --backfill-digests")
+    if args.backfill_digests and args.digests == 'off':
+        args.digests = 'extractive'
+
+    mapping = []
+    if args.map_file:
+        with open(args.map_file, 'r', encoding='utf-8') as file:
+            mapping.extend(json.load(file).items())
+    for item in args.map:
+        pattern, sep, category = item.partition('=')
+        if not sep:
+            parser.error(f"ожидается ШАБЛОН=КАТЕГОРИЯ, получено '{item}'")
+        mapping.append((pattern, category))
+
+    files = find_files(args.paths)
+    if args.paths:
+        print(f"Найдено файлов: {len(files)}")
+    with BookLibrary(args.db) as library:
+        backend = None
+        if args.digests == 'model':
+            load_dotenv()
+            backend = make_backend()
+        digests = start_worker(library, args.digests, backend)
+        failed = run_import(library, files, mapping, args.category, args.workers, args.batch, digests) if files else 0
+        if args.backfill_digests:
+            # Новые книги уже стоят в очереди; повторная постановка ничего не строит дважды
+            missing = library.books_without_digest()
+            print(f"Книг без дайджеста: {len(missing)}")
+            for book_id in missing:
+                digests.schedule(book_id)
+        if digests:
+            print("Дожидаюсь построения дайджестов...")
+            digests.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
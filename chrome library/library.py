@@ -0,0 +1,646 @@
+import re
+import json
+import zlib
+import sqlite3
+import hashlib
+import unicodedata
+import threading
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DB_PATH = "books.db"
+
+# Сжатие текстов книг: zstd, если установлен, иначе zlib
+COMPRESSION = 'zstd' if zstandard else 'zlib'
+COMPRESSION_LEVEL = 6
+MIGRATION_BATCH = 100
+# Текст хранится кусками: их можно читать по одному, не распаковывая книгу целиком
+CHUNK_CHARS = 16384
+PAGE_CHARS = 4000
+
+# Полнотекстовый поиск: книги режутся на фрагменты примерно такого размера
+PASSAGE_CHARS = 1500
+SEARCH_STEM_LENGTH = 6      # слова ищутся по префиксу, это заменяет стемминг
+SNIPPET_TOKENS = 16
+
+# Настройки соединения: WAL позволяет читать параллельно с записью
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",       # ~16 МБ страничного кэша
+    "PRAGMA mmap_size = 134217728",     # 128 МБ отображения файла в память
+)
+BUSY_TIMEOUT = 5.0
+STATEMENT_CACHE = 128
+
+# Все запросы — константы: sqlite3 кэширует подготовленные выражения по тексту SQL
+SQL_INSERT_BOOK = "INSERT INTO books (title, category, blob_id) VALUES (?, ?, ?)"
+SQL_INSERT_BLOB = "INSERT INTO blobs (hash, norm_hash, size, length) VALUES (?, ?, ?, ?)"
+SQL_INSERT_CHUNK = "INSERT INTO blob_chunks (blob_id, seq, start, length, codec, data) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_BLOB_BY_HASH = "SELECT id FROM blobs WHERE hash = ?"
+SQL_BLOB_BY_NORM_HASH = "SELECT id FROM blobs WHERE norm_hash = ? ORDER BY id LIMIT 1"
+SQL_CATEGORIES = "SELECT DISTINCT category FROM books ORDER BY category"
+SQL_BOOKS_BY_CATEGORY = "SELECT id, title FROM books WHERE category = ? ORDER BY title"
+SQL_BOOK_BLOB = "SELECT blob_id FROM books WHERE id = ?"
+SQL_HAS_DIGEST = "SELECT 1 FROM digests WHERE blob_id = ?"
+SQL_BOOKS_WITHOUT_DIGEST = """
+    SELECT min(k.id) FROM books k LEFT JOIN digests d ON d.blob_id = k.blob_id
+    WHERE d.blob_id IS NULL
+    GROUP BY k.blob_id
+    ORDER BY min(k.id)
+"""
+SQL_BOOK_LENGTH = "SELECT b.length FROM books k JOIN blobs b ON b.id = k.blob_id WHERE k.id = ?"
+SQL_CHUNKS = "SELECT start, codec, data FROM blob_chunks WHERE blob_id = ? ORDER BY seq"
+SQL_FIRST_CHUNK = "SELECT max(seq) FROM blob_chunks WHERE blob_id = ? AND start <= ?"
+SQL_CHUNK_RANGE = """
+    SELECT start, codec, data FROM blob_chunks
+    WHERE blob_id = ? AND seq >= ? AND start < ?
+    ORDER BY seq
+"""
+SQL_INSERT_PASSAGE = "INSERT INTO blob_passages (text, blob_id, start) VALUES (?, ?, ?)"
+SQL_RECORD_IMPORT = "INSERT OR REPLACE INTO imports (path, size, mtime, book_id) VALUES (?, ?, ?, ?)"
+SQL_IMPORTED = "SELECT path, size, mtime FROM imports"
+SQL_IMPORTED_BOOK = "SELECT k.id, k.blob_id FROM imports i JOIN books k ON k.id = i.book_id WHERE i.path = ?"
+SQL_UPDATE_BOOK = "UPDATE books SET title = ?, category = ?, blob_id = ? WHERE id = ?"
+SQL_BLOB_IN_USE = "SELECT 1 FROM books WHERE blob_id = ? LIMIT 1"
+SQL_DELETE_BLOB = "DELETE FROM blobs WHERE id = ?"
+SQL_DELETE_BLOB_PASSAGES = "DELETE FROM blob_passages WHERE blob_id = ?"
+# Фрагменты хранятся один раз на текст; книги с одинаковым текстом
+# возвращаются одной строкой, ID берётся наименьший, названия перечисляются
+SQL_SEARCH = """
+    SELECT min(k.id), group_concat(k.title, '; '), h.start, h.start + length(h.text), h.snip, h.text, h.score
+    FROM (
+        SELECT rowid AS pid, blob_id, start, text,
+               snippet(blob_passages, 0, '[', ']', '…', ?) AS snip, bm25(blob_passages) AS score
+        FROM blob_passages
+        WHERE blob_passages MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    ) h JOIN books k ON k.blob_id = h.blob_id
+    GROUP BY h.pid
+    ORDER BY h.score
+"""
+SQL_SEARCH_IN_BOOKS = """
+    SELECT min(k.id), group_concat(k.title, '; '), h.start, h.start + length(h.text), h.snip, h.text, h.score
+    FROM (
+        SELECT rowid AS pid, blob_id, start, text,
+               snippet(blob_passages, 0, '[', ']', '…', ?) AS snip, bm25(blob_passages) AS score
+        FROM blob_passages
+        WHERE blob_passages MATCH ?
+          AND blob_id IN (SELECT blob_id FROM books WHERE id IN (SELECT value FROM json_each(?)))
+        ORDER BY rank
+        LIMIT ?
+    ) h JOIN books k ON k.blob_id = h.blob_id AND k.id IN (SELECT value FROM json_each(?))
+    GROUP BY h.pid
+    ORDER BY h.score
+"""
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def compress_text(text, codec=COMPRESSION):
+    """
+    Возвращает (codec, сжатые байты) для хранения текста книги.
+    """
+    raw = text.encode('utf-8')
+    if codec == 'zstd':
+        return codec, zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compress(raw)
+    if codec == 'zlib':
+        return codec, zlib.compress(raw, COMPRESSION_LEVEL)
+    return 'raw', raw
+
+
+def decompress_text(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("Книга сжата zstd: установите пакет zstandard")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == 'zlib':
+        data = zlib.decompress(data)
+    return bytes(data).decode('utf-8')
+
+
+# --- Миграции схемы ---
+# Номер версии хранится в PRAGMA user_version; миграция N переводит базу из версии N в N+1.
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _migrate_catalogue(conn):
+    """
+    v0 -> v1: тексты книг вынесены из каталога в отдельную таблицу со сжатием,
+    добавлены индексы по категории и названию.
+    """
+    legacy = 'content' in _table_columns(conn, 'books')
+    if legacy:
+        conn.execute("ALTER TABLE books RENAME TO books_v0")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS books (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            category TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE book_contents (
+            book_id INTEGER PRIMARY KEY REFERENCES books (id) ON DELETE CASCADE,
+            codec TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX books_category ON books (category, title)")
+    conn.execute("CREATE INDEX books_title ON books (title)")
+    if not legacy:
+        return
+
+    conn.execute("INSERT INTO books (id, title, category) SELECT id, title, category FROM books_v0")
+    cursor = conn.execute("SELECT id, content FROM books_v0")
+    while True:
+        rows = cursor.fetchmany(MIGRATION_BATCH)
+        if not rows:
+            break
+        conn.executemany("INSERT INTO book_contents (book_id, codec, size, data) VALUES (?, ?, ?, ?)",
+                         [(book_id, *_content_row(content)) for book_id, content in rows])
+    conn.execute("DROP TABLE books_v0")
+
+
+def _content_row(text):
+    codec, data = compress_text(text)
+    return codec, len(text.encode('utf-8')), data
+
+
+def split_passages(text, passage_chars=PASSAGE_CHARS):
+    """
+    Делит текст на фрагменты по границам абзацев.
+    Возвращает список (смещение, текст фрагмента).
+    """
+    passages = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + passage_chars, length)
+        if end < length:
+            cut = text.rfind('\n', start + passage_chars // 2, end)
+            if cut != -1:
+                end = cut + 1
+        if text[start:end].strip():
+            passages.append((start, text[start:end]))
+        start = end
+    return passages
+
+
+def split_chunks(text, chunk_chars=CHUNK_CHARS):
+    """
+    Режет текст на сжатые куски для хранения: список (seq, start, length, codec, data).
+    """
+    chunks = []
+    for seq, start in enumerate(range(0, len(text), chunk_chars)):
+        piece = text[start:start + chunk_chars]
+        chunks.append((seq, start, len(piece), *compress_text(piece)))
+    return chunks
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def normalized_hash(text):
+    """
+    Хэш текста без учёта пробелов, переводов строк, BOM и форм Unicode:
+    совпадает у одной и той же книги, сохранённой по-разному.
+    """
+    text = unicodedata.normalize('NFKC', text).replace('\ufeff', '')
+    return content_hash(' '.join(text.split()))
+
+
+def prepare_book(title, category, text, source=None, size=None, mtime=None):
+    """
+    Готовит книгу к записи: считает хэши, сжимает текст и режет его на фрагменты.
+    База при этом не используется, поэтому функцию можно вызывать в рабочих потоках.
+    """
+    return {
+        'title': title,
+        'category': category,
+        'hash': content_hash(text),
+        'norm_hash': normalized_hash(text),
+        'size': len(text.encode('utf-8')),
+        'length': len(text),
+        'chunks': split_chunks(text),
+        'passages': split_passages(text),
+        'source': source,
+        'file_size': size,
+        'mtime': mtime,
+        'dedup': None,
+    }
+
+
+def _store_blob(conn, book, passage_rows):
+    """
+    Находит уже сохранённый текст книги или записывает новый.
+    Возвращает (blob_id, вид дубликата: None, 'exact' или 'normalized').
+    """
+    row = conn.execute(SQL_BLOB_BY_HASH, (book['hash'],)).fetchone()
+    if row:
+        return row[0], 'exact'
+    row = conn.execute(SQL_BLOB_BY_NORM_HASH, (book['norm_hash'],)).fetchone()
+    if row:
+        return row[0], 'normalized'
+    blob_id = conn.execute(SQL_INSERT_BLOB, (book['hash'], book['norm_hash'], book['size'], book['length'])).lastrowid
+    conn.executemany(SQL_INSERT_CHUNK, [(blob_id, *chunk) for chunk in book['chunks']])
+    passage_rows.extend((chunk, blob_id, start) for start, chunk in book['passages'])
+    return blob_id, None
+
+
+def _drop_unused_blob(conn, blob_id):
+    """
+    Удаляет текст, на который больше не ссылается ни одна книга, вместе с
+    кусками, дайджестом и поисковыми фрагментами.
+    """
+    if conn.execute(SQL_BLOB_IN_USE, (blob_id,)).fetchone():
+        return
+    conn.execute(SQL_DELETE_BLOB_PASSAGES, (blob_id,))
+    conn.execute(SQL_DELETE_BLOB, (blob_id,))
+
+
+def _migrate_search(conn):
+    """
+    v1 -> v2: полнотекстовый индекс FTS5 по фрагментам книг.
+    """
+    conn.execute("""
+        CREATE VIRTUAL TABLE book_passages USING fts5(
+            text,
+            book_id UNINDEXED,
+            start UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    for book_id, codec, data in conn.execute("SELECT book_id, codec, data FROM book_contents").fetchall():
+        conn.executemany("INSERT INTO book_passages (text, book_id, start) VALUES (?, ?, ?)",
+                         [(chunk, book_id, start) for start, chunk in split_passages(decompress_text(codec, data))])
+
+
+def build_match_query(query):
+    """
+    Превращает вопрос на естественном языке в запрос FTS5: любое из слов,
+    каждое по префиксу, чтобы находились разные формы слова.
+    """
+    terms = []
+    for word in WORD_RE.findall(query.lower()):
+        if len(word) < 3:
+            continue
+        term = f'"{word[:SEARCH_STEM_LENGTH]}"*'
+        if term not in terms:
+            terms.append(term)
+    return ' OR '.join(terms)
+
+
+def _migrate_imports(conn):
+    """
+    v2 -> v3: журнал импортированных файлов, чтобы массовый импорт можно было продолжить.
+    """
+    conn.execute("""
+        CREATE TABLE imports (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            book_id INTEGER REFERENCES books (id) ON DELETE CASCADE
+        )
+    """)
+
+
+def _migrate_blobs(conn):
+    """
+    v3 -> v4: тексты хранятся по хэшу содержимого. Книги с одинаковым
+    (или отличающимся только пробелами) текстом ссылаются на одну запись,
+    а поисковые фрагменты строятся один раз на текст.
+    """
+    conn.execute("""
+        CREATE TABLE blobs (
+            id INTEGER PRIMARY KEY,
+            hash TEXT NOT NULL UNIQUE,
+            norm_hash TEXT NOT NULL,
+            codec TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX blobs_norm_hash ON blobs (norm_hash)")
+    conn.execute("ALTER TABLE books ADD COLUMN blob_id INTEGER REFERENCES blobs (id)")
+    conn.execute("CREATE INDEX books_blob ON books (blob_id)")
+    conn.execute("""
+        CREATE VIRTUAL TABLE blob_passages USING fts5(
+            text,
+            blob_id UNINDEXED,
+            start UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )
+    """)
+    for book_id, codec, data in conn.execute("SELECT book_id, codec, data FROM book_contents ORDER BY book_id"):
+        text = decompress_text(codec, data)
+        text_hash, norm_hash = content_hash(text), normalized_hash(text)
+        row = (conn.execute("SELECT id FROM blobs WHERE hash = ?", (text_hash,)).fetchone()
+               or conn.execute("SELECT id FROM blobs WHERE norm_hash = ? ORDER BY id LIMIT 1", (norm_hash,)).fetchone())
+        if row:
+            blob_id = row[0]
+        else:
+            blob_id = conn.execute("INSERT INTO blobs (hash, norm_hash, codec, size, data) VALUES (?, ?, ?, ?, ?)",
+                                   (text_hash, norm_hash, *_content_row(text))).lastrowid
+            conn.executemany("INSERT INTO blob_passages (text, blob_id, start) VALUES (?, ?, ?)",
+                             [(chunk, blob_id, start) for start, chunk in split_passages(text)])
+        conn.execute("UPDATE books SET blob_id = ? WHERE id = ?", (blob_id, book_id))
+    conn.execute("DROP TABLE book_passages")
+    conn.execute("DROP TABLE book_contents")
+
+
+def _migrate_chunks(conn):
+    """
+    v4 -> v5: текст каждой книги хранится отдельно сжатыми кусками по
+    CHUNK_CHARS символов, чтобы читать диапазоны и страницы без загрузки всей книги.
+    """
+    conn.execute("""
+        CREATE TABLE blob_chunks (
+            blob_id INTEGER NOT NULL REFERENCES blobs (id) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            start INTEGER NOT NULL,
+            length INTEGER NOT NULL,
+            codec TEXT NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (blob_id, seq)
+        )
+    """)
+    conn.execute("CREATE INDEX blob_chunks_start ON blob_chunks (blob_id, start)")
+    conn.execute("ALTER TABLE blobs ADD COLUMN length INTEGER NOT NULL DEFAULT 0")
+    for blob_id, codec, data in conn.execute("SELECT id, codec, data FROM blobs ORDER BY id").fetchall():
+        text = decompress_text(codec, data)
+        conn.executemany(SQL_INSERT_CHUNK, [(blob_id, *chunk) for chunk in split_chunks(text)])
+        conn.execute("UPDATE blobs SET length = ? WHERE id = ?", (len(text), blob_id))
+    conn.execute("ALTER TABLE blobs DROP COLUMN data")
+    conn.execute("ALTER TABLE blobs DROP COLUMN codec")
+
+
+def _migrate_digests(conn):
+    """
+    v5 -> v6: дайджесты текстов — оглавление с пересказами разделов и указатель имён.
+    """
+    conn.execute("""
+        CREATE TABLE digests (
+            blob_id INTEGER PRIMARY KEY REFERENCES blobs (id) ON DELETE CASCADE,
+            created REAL NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE digest_sections (
+            blob_id INTEGER NOT NULL REFERENCES blobs (id) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            start INTEGER NOT NULL,
+            end INTEGER NOT NULL,
+            summary TEXT NOT NULL,
+            PRIMARY KEY (blob_id, seq)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE digest_terms (
+            blob_id INTEGER NOT NULL REFERENCES blobs (id) ON DELETE CASCADE,
+            term TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (blob_id, term, seq)
+        )
+    """)
+
+
+MIGRATIONS = [
+    _migrate_catalogue,
+    _migrate_search,
+    _migrate_imports,
+    _migrate_blobs,
+    _migrate_chunks,
+    _migrate_digests,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+class BookLibrary:
+    """
+    Хранилище книг поверх SQLite. Каждый поток получает одно долгоживущее
+    соединение, которое переиспользуется между вызовами.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self.migrate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE,
+                                   check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.conn
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def migrate(self):
+        """
+        Доводит схему базы до SCHEMA_VERSION. Старые books.db (с текстом
+        в таблице books) обновляются автоматически при первом открытии.
+        """
+        conn = self.conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Другой процесс мог успеть обновить базу, пока мы ждали блокировку
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for step in MIGRATIONS[version:]:
+                step(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if conn.execute("SELECT 1 FROM books LIMIT 1").fetchone():
+            # После переноса текстов освобождаем место, занятое старыми таблицами
+            conn.execute("VACUUM")
+
+    def add_book(self, title, category, file_path):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            content = file.read()
+        book = prepare_book(title, category, content)
+        return self.add_books([book])[0], book['dedup']
+
+    def add_books(self, books):
+        """
+        Записывает пачку подготовленных книг (см. prepare_book) одной транзакцией.
+        Возвращает список присвоенных ID. Если текст книги уже есть в библиотеке,
+        новая книга ссылается на него, а в book['dedup'] записывается вид совпадения.
+        Файл, который уже импортировался раньше (изменился размер или mtime),
+        заменяет прежнюю книгу под тем же ID, а её старый текст удаляется,
+        если он больше никому не нужен; тогда book['replaced'] = True.
+        """
+        with self.transaction() as conn:
+            ids = []
+            passage_rows = []
+            stale_blobs = []
+            for book in books:
+                blob_id, book['dedup'] = _store_blob(conn, book, passage_rows)
+                previous = conn.execute(SQL_IMPORTED_BOOK, (book['source'],)).fetchone() if book['source'] else None
+                book['replaced'] = previous is not None
+                if previous:
+                    book_id, old_blob_id = previous
+                    conn.execute(SQL_UPDATE_BOOK, (book['title'], book['category'], blob_id, book_id))
+                    if old_blob_id != blob_id:
+                        stale_blobs.append(old_blob_id)
+                    ids.append(book_id)
+                else:
+                    ids.append(conn.execute(SQL_INSERT_BOOK, (book['title'], book['category'], blob_id)).lastrowid)
+            for blob_id in stale_blobs:
+                _drop_unused_blob(conn, blob_id)
+            conn.executemany(SQL_INSERT_PASSAGE, passage_rows)
+            conn.executemany(SQL_RECORD_IMPORT, [(book['source'], book['file_size'], book['mtime'], book_id)
+                                                 for book_id, book in zip(ids, books) if book['source']])
+        return ids
+
+    def imported_files(self):
+        """
+        Возвращает {путь: (размер, mtime)} для файлов, уже загруженных массовым импортом.
+        """
+        return {path: (size, mtime) for path, size, mtime in self.conn.execute(SQL_IMPORTED)}
+
+    def list_categories(self):
+        return [row[0] for row in self.conn.execute(SQL_CATEGORIES)]
+
+    def list_books_by_category(self, category):
+        return self.conn.execute(SQL_BOOKS_BY_CATEGORY, (category,)).fetchall()
+
+    def get_book_text(self, book_id):
+        """
+        Возвращает текст книги целиком. Для больших книг лучше iter_chunks,
+        iter_pages или read_range.
+        """
+        if self.book_length(book_id) is None:
+            return None
+        return ''.join(text for _, text in self.iter_chunks(book_id))
+
+    def book_blob(self, book_id):
+        """
+        ID сохранённого текста книги (общий у книг-дубликатов) или None.
+        """
+        row = self.conn.execute(SQL_BOOK_BLOB, (book_id,)).fetchone()
+        return row[0] if row else None
+
+    def has_digest(self, blob_id):
+        return self.conn.execute(SQL_HAS_DIGEST, (blob_id,)).fetchone() is not None
+
+    def books_without_digest(self):
+        """
+        ID книг, для текста которых дайджест ещё не построен (по одной на текст).
+        """
+        return [row[0] for row in self.conn.execute(SQL_BOOKS_WITHOUT_DIGEST)]
+
+    def book_length(self, book_id):
+        """
+        Длина текста книги в символах или None, если книги нет.
+        """
+        row = self.conn.execute(SQL_BOOK_LENGTH, (book_id,)).fetchone()
+        return row[0] if row else None
+
+    def iter_chunks(self, book_id):
+        """
+        Отдаёт текст книги кусками (смещение, текст); в памяти одновременно один кусок.
+        """
+        row = self.conn.execute(SQL_BOOK_BLOB, (book_id,)).fetchone()
+        if not row:
+            return
+        for start, codec, data in self.conn.execute(SQL_CHUNKS, (row[0],)):
+            yield start, decompress_text(codec, data)
+
+    def iter_pages(self, book_id, page_chars=PAGE_CHARS):
+        """
+        Отдаёт текст книги страницами по page_chars символов: (номер с 1, смещение, текст).
+        """
+        buffer = ''
+        offset = 0
+        page = 1
+        for _, text in self.iter_chunks(book_id):
+            buffer += text
+            while len(buffer) >= page_chars:
+                yield page, offset, buffer[:page_chars]
+                buffer = buffer[page_chars:]
+                offset += page_chars
+                page += 1
+        if buffer:
+            yield page, offset, buffer
+
+    def read_range(self, book_id, start, end):
+        """
+        Читает символы [start, end) текста книги, распаковывая только нужные куски.
+        """
+        row = self.conn.execute(SQL_BOOK_BLOB, (book_id,)).fetchone()
+        if not row or end <= start:
+            return ''
+        blob_id = row[0]
+        first = self.conn.execute(SQL_FIRST_CHUNK, (blob_id, max(start, 0))).fetchone()[0] or 0
+        parts = []
+        for chunk_start, codec, data in self.conn.execute(SQL_CHUNK_RANGE, (blob_id, first, end)):
+            text = decompress_text(codec, data)
+            parts.append(text[max(start - chunk_start, 0):end - chunk_start])
+        return ''.join(parts)
+
+    def search(self, query, limit=10, book_ids=None):
+        """
+        Ищет фрагменты, относящиеся к запросу, во всей библиотеке или в
+        указанных книгах. Возвращает список словарей, лучшие совпадения первыми:
+        book_id, title, start, end (смещения в тексте книги), snippet, text, score.
+        """
+        match = build_match_query(query)
+        if not match:
+            return []
+        if book_ids:
+            ids = json.dumps([int(book_id) for book_id in book_ids])
+            rows = self.conn.execute(SQL_SEARCH_IN_BOOKS, (SNIPPET_TOKENS, match, ids, limit, ids))
+        else:
+            rows = self.conn.execute(SQL_SEARCH, (SNIPPET_TOKENS, match, limit))
+        keys = ('book_id', 'title', 'start', 'end', 'snippet', 'text', 'score')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
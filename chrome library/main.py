@@ -1,72 +1,24 @@
 import os
-import sqlite3
+import time
 from dotenv import load_dotenv
-import google.generativeai as genai
+from library import BookLibrary
+from digests import start_worker, route_question
+from models import make_backend
 
 # Загрузка API-ключа из .env
 load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=api_key)
-
-# --- Работа с базой данных ---
-def initialize_db():
-    conn = sqlite3.connect("books.db")
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            category TEXT NOT NULL,
-            content TEXT NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def add_book(title, category, file_path):
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-
-        conn = sqlite3.connect("books.db")
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO books (title, category, content) VALUES (?, ?, ?)",
-                       (title, category, content))
-        conn.commit()
-        conn.close()
-        print(f"Книга '{title}' добавлена в категорию '{category}'.")
-    except Exception as e:
-        print(f"Ошибка при добавлении книги: {e}")
 
-def list_categories():
-    conn = sqlite3.connect("books.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT category FROM books")
-    categories = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return categories
-
-def list_books_by_category(category):
-    conn = sqlite3.connect("books.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, title FROM books WHERE category = ?", (category,))
-    books = cursor.fetchall()
-    conn.close()
-    return books
-
-def get_book_text(book_id):
-    conn = sqlite3.connect("books.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT content FROM books WHERE id = ?", (book_id,))
-    row = cursor.fetchone()
-    conn.close()
-    return row[0] if row else None
+# Печатать ответ по мере генерации (0 — ждать ответ целиком)
+STREAM_ANSWERS = os.getenv("BOOK_STREAM", "1") != "0"
+# Сколько найденных фрагментов книги отправлять модели; 0 — вся книга целиком
+PASSAGES_TOP_K = int(os.getenv("BOOK_TOP_K", "6"))
+SEARCH_RESULTS = 10
+# Дайджесты книг при добавлении: off, extractive (без модели) или model
+DIGEST_MODE = os.getenv("BOOK_DIGESTS", "extractive")
 
 # --- Взаимодействие с Gemini ---
-def ask_question(book_text, question):
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        prompt = f"""Ты помощник, который отвечает на вопросы по тексту книги.
+def build_prompt(book_text, question):
+    return f"""Ты помощник, который отвечает на вопросы по тексту книги.
 
 Текст книги:
 {book_text}
@@ -74,21 +26,106 @@ def ask_question(book_text, question):
 Вопрос: {question}
 
 Пожалуйста, ответь на вопрос, основываясь только на содержании предоставленной книги."""
-        response = model.generate_content(prompt)
-        return response.text
+
+def ask_question(book_text, question, backend):
+    try:
+        return backend.generate(build_prompt(book_text, question))
     except Exception as e:
         print(f"Ошибка при запросе к API: {e}")
         return None
 
+def stream_answer(book_text, question, backend):
+    """
+    Печатает ответ по мере генерации и сообщает время до первого фрагмента
+    и общее время. Если поток не удалось начать, делает обычный запрос.
+    """
+    start = time.perf_counter()
+    first_chunk = None
+    parts = []
+    try:
+        for part in backend.stream(build_prompt(book_text, question)):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+                print("\nОтвет: ", end='', flush=True)
+            print(part, end='', flush=True)
+            parts.append(part)
+    except Exception as e:
+        if not parts:
+            print(f"Потоковый режим недоступен ({e}), выполняю обычный запрос...")
+            answer = ask_question(book_text, question, backend)
+            if answer:
+                print(f"\nОтвет: {answer}")
+            return answer
+        print(f"\nОтвет прерван: {e}")
+
+    if parts:
+        total = time.perf_counter() - start
+        print(f"\n\n(первый фрагмент: {first_chunk:.2f} с, всего: {total:.2f} с)")
+    return ''.join(parts) or None
+
+def format_passages(hits):
+    return "\n\n".join(f"[{hit['title']}, фрагмент {hit['start']}-{hit['end']}]\n{hit['text'].strip()}"
+                       for hit in hits)
+
+def select_context(library, book_id, question):
+    """
+    Выбирает из книги фрагменты, подходящие к вопросу: сначала по дайджесту
+    (главы, имена), затем полнотекстовым поиском. Если ничего не нашлось
+    или PASSAGES_TOP_K = 0, читает из базы весь текст книги.
+    """
+    if PASSAGES_TOP_K > 0:
+        context = route_question(library, book_id, question)
+        if context:
+            return context
+        hits = library.search(question, PASSAGES_TOP_K, book_ids=[book_id])
+        if hits:
+            return format_passages(hits)
+    return library.get_book_text(book_id)
+
+def answer_question(context, question, backend):
+    print("Обрабатываю запрос...")
+    if STREAM_ANSWERS:
+        answer = stream_answer(context, question, backend)
+    else:
+        answer = ask_question(context, question, backend)
+        if answer:
+            print(f"\nОтвет: {answer}")
+
+    if not answer:
+        print("Не удалось получить ответ.")
+
 # --- Главный интерфейс ---
-def main():
-    initialize_db()
+def add_book(library, title, category, file_path, digests=None):
+    try:
+        book_id, dedup = library.add_book(title, category, file_path)
+        if digests:
+            digests.schedule(book_id)
+        print(f"Книга '{title}' добавлена в категорию '{category}'.")
+        if dedup == 'exact':
+            print("Такой текст уже есть в библиотеке, повторно он не сохранялся.")
+        elif dedup == 'normalized':
+            print("В библиотеке уже есть этот текст (отличается только пробелами или кодировкой), используется он.")
+    except Exception as e:
+        print(f"Ошибка при добавлении книги: {e}")
 
+def main():
+    # BOOK_QA_BACKEND=mock или local позволяет работать без сети
+    backend = make_backend()
+    with BookLibrary() as library:
+        digests = start_worker(library, DIGEST_MODE, backend)
+        try:
+            menu_loop(library, backend, digests)
+        finally:
+            if digests:
+                digests.close()
+
+def menu_loop(library, backend, digests=None):
     while True:
         print("\nМеню:")
         print("1. Добавить книгу")
         print("2. Задать вопрос по книге")
-        print("3. Выйти")
+        print("3. Поиск по библиотеке")
+        print("4. Выйти")
 
         choice = input("Выберите опцию: ")
 
@@ -96,10 +133,10 @@ def main():
             title = input("Название книги: ")
             category = input("Категория: ")
             file_path = input("Путь к файлу книги: ")
-            add_book(title, category, file_path)
+            add_book(library, title, category, file_path, digests)
 
         elif choice == '2':
-            categories = list_categories()
+            categories = library.list_categories()
             if not categories:
                 print("Нет доступных категорий.")
                 continue
@@ -115,7 +152,7 @@ def main():
                 print("Неверный выбор категории.")
                 continue
 
-            books = list_books_by_category(selected_category)
+            books = library.list_books_by_category(selected_category)
             if not books:
                 print("Нет книг в этой категории.")
                 continue
@@ -124,10 +161,13 @@ def main():
             for id, title in books:
                 print(f"{id}. {title}")
 
-            book_id = input("Введите ID книги: ")
-            book_text = get_book_text(book_id)
-
-            if not book_text:
+            try:
+                book_id = int(input("Введите ID книги: "))
+            except ValueError:
+                print("Книга не найдена.")
+                continue
+            # Текст книги в памяти не держим: на каждый вопрос читаются только нужные фрагменты
+            if not library.book_length(book_id):
                 print("Книга не найдена.")
                 continue
 
@@ -138,15 +178,26 @@ def main():
                 if question.lower() == 'назад':
                     break
 
-                print("Обрабатываю запрос...")
-                answer = ask_question(book_text, question)
-
-                if answer:
-                    print(f"\nОтвет: {answer}")
-                else:
-                    print("Не удалось получить ответ.")
+                answer_question(select_context(library, book_id, question), question, backend)
 
         elif choice == '3':
+            query = input("Что искать: ")
+            started = time.perf_counter()
+            hits = library.search(query, SEARCH_RESULTS)
+            elapsed = (time.perf_counter() - started) * 1000
+            if not hits:
+                print("Ничего не найдено.")
+                continue
+
+            print(f"\nНайдено фрагментов: {len(hits)} ({elapsed:.0f} мс)")
+            for hit in hits:
+                print(f"- {hit['title']} (ID {hit['book_id']}), символы {hit['start']}-{hit['end']}: {hit['snippet']}")
+
+            question = input("\nВопрос по найденным фрагментам (или Enter — назад): ")
+            if question.strip():
+                answer_question(format_passages(hits), question, backend)
+
+        elif choice == '4':
             print("Выход из программы.")
             break
         else:
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Бэкенды моделей общие с соседним приложением chrome/ (chrome/backends.py):
+# один модуль на оба, без копий. Каталог добавляется в конец sys.path,
+# чтобы одноимённые скрипты этой папки (main.py и др.) не подменялись.
+CHROME_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'chrome'))
+if CHROME_DIR not in sys.path:
+    sys.path.append(CHROME_DIR)
+
+from backends import BACKENDS, estimate_tokens, make_backend  # noqa: E402
@@ -0,0 +1,119 @@
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Настройки кэша ответов
+MEMORY_ENTRIES = 256              # размер LRU в памяти
+DISK_ENTRIES = 5000               # сколько ответов хранить на диске
+TTL_SECONDS = 7 * 24 * 3600       # срок жизни ответа
+
+PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """
+    Приводит вопрос к каноническому виду: регистр, "ё", пунктуация, пробелы.
+    """
+    text = question.lower().replace('ё', 'е')
+    text = PUNCT_RE.sub(' ', text)
+    return SPACE_RE.sub(' ', text).strip()
+
+
+def make_key(book_hash, question, model_name, context=''):
+    """
+    context описывает, из чего строится промпт (вся книга или top_k
+    фрагментов): ответ, полученный при других настройках, не подходит.
+    """
+    raw = f"{book_hash}\x00{normalize_question(question)}\x00{model_name}\x00{context}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class AnswerCache:
+    """
+    Двухуровневый кэш ответов: LRU в памяти и SQLite на диске.
+    """
+
+    def __init__(self, db_path, memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES, ttl=TTL_SECONDS):
+        self.memory = OrderedDict()
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                answer TEXT NOT NULL,
+                created REAL NOT NULL,
+                used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS answers_used ON answers (used)")
+        self.conn.commit()
+
+    def get(self, book_hash, question, model_name, context=''):
+        key = make_key(book_hash, question, model_name, context)
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry and now - entry[1] <= self.ttl:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self.memory[key]
+
+            row = self.conn.execute("SELECT answer, created FROM answers WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl:
+                self.conn.execute("UPDATE answers SET used = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                self.disk_hits += 1
+                return row[0]
+            if row:
+                self.conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self.conn.commit()
+            self.misses += 1
+            return None
+
+    def put(self, book_hash, question, model_name, answer, context=''):
+        key = make_key(book_hash, question, model_name, context)
+        now = time.time()
+        with self.lock:
+            self._remember(key, answer, now)
+            self.conn.execute("INSERT OR REPLACE INTO answers (key, answer, created, used) VALUES (?, ?, ?, ?)",
+                              (key, answer, now, now))
+            self._evict(now)
+            self.conn.commit()
+
+    def _remember(self, key, answer, created):
+        self.memory[key] = (answer, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _evict(self, now):
+        self.conn.execute("DELETE FROM answers WHERE created < ?", (now - self.ttl,))
+        self.conn.execute("""
+            DELETE FROM answers WHERE key IN (
+                SELECT key FROM answers ORDER BY used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.disk_entries,))
+
+    def stats(self):
+        total = self.hits + self.misses
+        rate = self.hits * 100 / total if total else 0
+        return (f"Кэш ответов: попаданий {self.hits} (с диска {self.disk_hits}), "
+                f"промахов {self.misses}, доля попаданий {rate:.0f}%")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,158 @@
+import os
+import time
+import hashlib
+import datetime
+
+# Для кэширования контекста Gemini нужна зафиксированная версия модели
+MODEL_NAME = 'gemini-1.5-flash-002'
+CONTEXT_CACHE_TTL_MINUTES = 60
+
+# Профиль задержек локальной заглушки (грубо похож на gemini-1.5-flash)
+LOCAL_BASE_LATENCY = 0.25          # секунд на запрос
+LOCAL_SECONDS_PER_1K_TOKENS = 0.02  # обработка входных токенов
+LOCAL_CACHED_TOKEN_FACTOR = 0.25    # токены из кэша контекста обходятся дешевле
+LOCAL_OUTPUT_TOKENS_PER_SECOND = 150
+
+
+def estimate_tokens(text):
+    """
+    Грубая оценка числа токенов: около 4 байт UTF-8 на токен
+    (для кириллицы это примерно 2 символа на токен).
+    """
+    return (len(text.encode('utf-8')) + 3) // 4
+
+
+class GeminiBackend:
+    """
+    Обёртка над google.generativeai: одна модель на сессию и, по возможности,
+    текст книги, загруженный один раз через кэширование контекста.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, api_key=None):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self.genai = genai
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+        self.cached_content = None
+
+    def cache_prefix(self, prefix, ttl_minutes=CONTEXT_CACHE_TTL_MINUTES):
+        """
+        Загружает общий префикс промпта в кэш контекста провайдера.
+        Возвращает True, если дальше можно отправлять только вопрос.
+        """
+        from google.generativeai import caching
+        try:
+            self.cached_content = caching.CachedContent.create(
+                model=f"models/{self.model_name}",
+                display_name="book-qa",
+                contents=[prefix],
+                ttl=datetime.timedelta(minutes=ttl_minutes),
+            )
+            self.model = self.genai.GenerativeModel.from_cached_content(cached_content=self.cached_content)
+            return True
+        except Exception as e:
+            # Например, слишком короткий текст: у кэша есть минимальный размер
+            print(f"Кэширование контекста недоступно, книга будет отправляться целиком: {e}")
+            self.cached_content = None
+            return False
+
+    def generate(self, prompt):
+        response = self.model.generate_content(prompt)
+        return response.text
+
+    def stream(self, prompt):
+        """
+        Возвращает текст ответа по частям, по мере генерации.
+        """
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if chunk.parts:
+                yield chunk.text
+
+    def close(self):
+        if self.cached_content is not None:
+            try:
+                self.cached_content.delete()
+            except Exception:
+                pass
+            self.cached_content = None
+
+
+class MockBackend:
+    """
+    Детерминированная заглушка без сети: запоминает промпты и возвращает
+    ответ, зависящий только от полного контекста запроса.
+    """
+
+    def __init__(self, model_name='mock'):
+        self.model_name = model_name
+        self.cached_prefix = None
+        self.prompts = []
+
+    def cache_prefix(self, prefix, ttl_minutes=CONTEXT_CACHE_TTL_MINUTES):
+        self.cached_prefix = prefix
+        return True
+
+    def generate(self, prompt):
+        self.prompts.append(prompt)
+        full = (self.cached_prefix or '') + prompt
+        digest = hashlib.sha1(full.encode('utf-8')).hexdigest()[:12]
+        return f"Тестовый ответ {digest} (промпт: {len(prompt)} символов)"
+
+    def stream(self, prompt):
+        for i, word in enumerate(self.generate(prompt).split(' ')):
+            yield word if i == 0 else ' ' + word
+
+    def close(self):
+        self.cached_prefix = None
+
+
+class LocalBackend(MockBackend):
+    """
+    Детерминированная замена модели для замеров: задержка растёт
+    пропорционально числу входных токенов, ответ генерируется с постоянной скоростью.
+    """
+
+    def __init__(self, model_name='local', base_latency=LOCAL_BASE_LATENCY,
+                 seconds_per_1k_tokens=LOCAL_SECONDS_PER_1K_TOKENS,
+                 output_tokens_per_second=LOCAL_OUTPUT_TOKENS_PER_SECOND):
+        super().__init__(model_name)
+        self.base_latency = base_latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.output_tokens_per_second = output_tokens_per_second
+
+    def prefill_seconds(self, prompt):
+        tokens = estimate_tokens(prompt)
+        if self.cached_prefix:
+            tokens += estimate_tokens(self.cached_prefix) * LOCAL_CACHED_TOKEN_FACTOR
+        return self.base_latency + tokens / 1000 * self.seconds_per_1k_tokens
+
+    def generate(self, prompt):
+        answer = super().generate(prompt)
+        time.sleep(self.prefill_seconds(prompt) + estimate_tokens(answer) / self.output_tokens_per_second)
+        return answer
+
+    def stream(self, prompt):
+        answer = super().generate(prompt)
+        time.sleep(self.prefill_seconds(prompt))
+        for i, word in enumerate(answer.split(' ')):
+            part = word if i == 0 else ' ' + word
+            time.sleep(estimate_tokens(part) / self.output_tokens_per_second)
+            yield part
+
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'mock': MockBackend,
+    'local': LocalBackend,
+}
+
+
+def make_backend(name=None, **kwargs):
+    """
+    Создаёт бэкенд по имени (по умолчанию из переменной BOOK_QA_BACKEND).
+    """
+    name = (name or os.getenv("BOOK_QA_BACKEND") or 'gemini').lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд '{name}', доступны: {', '.join(BACKENDS)}")
+    return BACKENDS[name](**kwargs)
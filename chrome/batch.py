@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+from backends import make_backend
+from session import BookSession
+
+load_dotenv()
+
+# Настройки пакетного режима
+DEFAULT_CONCURRENCY = 8
+DEFAULT_RATE = 2.0          # запросов к модели в секунду
+DEFAULT_BURST = 4
+DEFAULT_RETRIES = 5
+BACKOFF_INITIAL = 2.0
+BACKOFF_MAX = 60.0
+
+QUOTA_ERRORS = ('ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'DeadlineExceeded')
+
+
+class TokenBucket:
+    """
+    Потокобезопасный ограничитель частоты: rate токенов в секунду, не больше burst подряд.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimitedBackend:
+    """
+    Пропускает обращения к модели через TokenBucket; ответы из кэша лимит не тратят.
+    """
+
+    def __init__(self, backend, bucket):
+        self.backend = backend
+        self.bucket = bucket
+        self.model_name = backend.model_name
+
+    def cache_prefix(self, prefix, **kwargs):
+        return self.backend.cache_prefix(prefix, **kwargs)
+
+    def generate(self, prompt):
+        self.bucket.acquire()
+        return self.backend.generate(prompt)
+
+    def stream(self, prompt):
+        self.bucket.acquire()
+        return self.backend.stream(prompt)
+
+    def close(self):
+        self.backend.close()
+
+
+def is_quota_error(error):
+    return type(error).__name__ in QUOTA_ERRORS or '429' in str(error)
+
+
+def ask_with_retry(session, question, retries=DEFAULT_RETRIES):
+    """
+    Задаёт вопрос, повторяя его с экспоненциальной задержкой при ошибках квоты.
+    Возвращает (ответ, из_кэша, число_попыток).
+    """
+    delay = BACKOFF_INITIAL
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            answer, cached = session.ask(question)
+            return answer, cached, attempt
+        except Exception as e:
+            if attempt > retries or not is_quota_error(e):
+                raise
+            time.sleep(min(delay, BACKOFF_MAX) * random.uniform(0.5, 1.5))
+            delay *= 2
+
+
+def read_questions(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def run_batch(session, questions, out_path, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES):
+    """
+    Отвечает на вопросы параллельно и пишет результаты в JSONL по мере готовности.
+    """
+    started = time.perf_counter()
+    done = 0
+    failed = 0
+
+    def work(index, question):
+        t0 = time.perf_counter()
+        record = {'index': index, 'question': question}
+        try:
+            answer, cached, attempts = ask_with_retry(session, question, retries)
+            record.update(answer=answer, cached=cached, attempts=attempts)
+        except Exception as e:
+            record.update(answer=None, error=str(e))
+        record['seconds'] = round(time.perf_counter() - t0, 3)
+        return record
+
+    with open(out_path, 'w', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(work, i, q) for i, q in enumerate(questions)]
+        for future in as_completed(futures):
+            record = future.result()
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            done += 1
+            if record.get('error'):
+                failed += 1
+                print(f"[{done}/{len(questions)}] Ошибка: {record['question'][:60]} — {record['error']}")
+            else:
+                print(f"[{done}/{len(questions)}] {record['seconds']:.2f} с — {record['question'][:60]}")
+
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0
+    print(f"Готово: {done} вопросов за {elapsed:.1f} с ({rate:.2f} вопр./с), ошибок: {failed}")
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетные ответы на вопросы по книге (JSONL).")
+    parser.add_argument('questions', help="файл с вопросами, по одному на строку")
+    parser.add_argument('-o', '--output', default='answers.jsonl', help="куда писать ответы")
+    parser.add_argument('--book', default='book.txt', help="путь к файлу книги")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="число одновременных запросов")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="лимит запросов к модели в секунду")
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST, help="сколько запросов можно отправить подряд")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES, help="повторов при ошибках квоты")
+    parser.add_argument('--top-k', type=int, default=int(os.getenv("BOOK_TOP_K", "6")),
+                        help="фрагментов книги в промпте (0 — вся книга)")
+    parser.add_argument('--backend', default=None, help="gemini, mock или local")
+    parser.add_argument('--cache', default='answers.db', help="файл кэша ответов")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.book, 'r', encoding='utf-8') as file:
+            book_text = file.read()
+    except FileNotFoundError:
+        print("Файл книги не найден. Проверьте путь к файлу.")
+        return 1
+    questions = read_questions(args.questions)
+
+    backend = RateLimitedBackend(make_backend(args.backend), TokenBucket(args.rate, args.burst))
+    session = BookSession(args.book, book_text, backend, args.top_k, args.cache)
+    try:
+        failed = run_batch(session, questions, args.output, args.concurrency, args.retries)
+    finally:
+        print(session.cache.stats())
+        session.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+
+from backends import make_backend, estimate_tokens
+from session import BookSession, PROMPT_PREFIX
+
+# Сценарии: как отправлять книгу модели
+SCENARIOS = {
+    'full': ("вся книга", dict(top_k=0, cache_context=False)),
+    'context-cache': ("кэш контекста", dict(top_k=0, cache_context=True)),
+    'top3': ("поиск, 3 фрагмента", dict(top_k=3)),
+    'top6': ("поиск, 6 фрагментов", dict(top_k=6)),
+    'top12': ("поиск, 12 фрагментов", dict(top_k=12)),
+}
+
+
+class MeteredBackend:
+    """
+    Считает размер каждого промпта, переданного настоящему бэкенду.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.prompt_sizes = []
+        self.prefix_tokens = 0
+
+    def cache_prefix(self, prefix, **kwargs):
+        cached = self.backend.cache_prefix(prefix, **kwargs)
+        if cached:
+            self.prefix_tokens = estimate_tokens(prefix)
+        return cached
+
+    def generate(self, prompt):
+        self.prompt_sizes.append((len(prompt.encode('utf-8')), estimate_tokens(prompt)))
+        return self.backend.generate(prompt)
+
+    def stream(self, prompt):
+        self.prompt_sizes.append((len(prompt.encode('utf-8')), estimate_tokens(prompt)))
+        return self.backend.stream(prompt)
+
+    def close(self):
+        self.backend.close()
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def run_scenario(book_path, book_text, questions, backend_name, repeat, top_k=0, cache_context=True):
+    """
+    Прогоняет набор вопросов repeat раз и возвращает замеры по каждому вопросу.
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = MeteredBackend(make_backend(backend_name))
+        session = BookSession(book_path, book_text, backend, top_k, os.path.join(tmp, 'answers.db'),
+                              cache_context=cache_context)
+        try:
+            for run in range(repeat):
+                for question in questions:
+                    calls = len(backend.prompt_sizes)
+                    start = time.perf_counter()
+                    answer, cached = session.ask(question)
+                    seconds = time.perf_counter() - start
+                    prompt_bytes, tokens = backend.prompt_sizes[-1] if len(backend.prompt_sizes) > calls else (0, 0)
+                    rows.append({'run': run, 'question': question, 'seconds': seconds, 'cached': cached,
+                                 'prompt_bytes': prompt_bytes, 'tokens': tokens})
+        finally:
+            session.close()
+    return rows, backend.prefix_tokens
+
+
+def summarize(rows):
+    """
+    Задержки считаются отдельно для первого прохода (запросы к модели)
+    и для повторов (ответы из кэша).
+    """
+    cold = [r for r in rows if r['run'] == 0]
+    warm = [r['seconds'] for r in rows if r['run'] > 0]
+    calls = [r for r in rows if r['prompt_bytes']] or [{'prompt_bytes': 0, 'tokens': 0}]
+    return {
+        'questions': len(cold),
+        'p50': percentile([r['seconds'] for r in cold], 50),
+        'p95': percentile([r['seconds'] for r in cold], 95),
+        'repeat_p50': percentile(warm, 50),
+        'prompt_bytes': sum(r['prompt_bytes'] for r in calls) / len(calls),
+        'tokens': sum(r['tokens'] for r in calls) / len(calls),
+        'cache_hits': sum(1 for r in rows if r['cached']),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замер задержки и размера промптов для вопросов по книге.")
+    parser.add_argument('questions', nargs='?', default='bench_questions.txt', help="файл с вопросами")
+    parser.add_argument('--book', default='book.txt', help="путь к файлу книги")
+    parser.add_argument('--backend', default='local', help="gemini, mock или local")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="список сценариев через запятую")
+    parser.add_argument('--repeat', type=int, default=2, help="сколько раз повторить набор (повторы бьют в кэш ответов)")
+    parser.add_argument('--json', default=None, help="сохранить замеры по каждому вопросу в JSON")
+    args = parser.parse_args(argv)
+
+    with open(args.book, 'r', encoding='utf-8') as file:
+        book_text = file.read()
+    with open(args.questions, 'r', encoding='utf-8') as file:
+        questions = [line.strip() for line in file if line.strip()]
+
+    print(f"Книга: {args.book} ({len(book_text.encode('utf-8'))} байт, "
+          f"~{estimate_tokens(PROMPT_PREFIX.format(book_text=book_text))} токенов), "
+          f"вопросов: {len(questions)} x {args.repeat}, бэкенд: {args.backend}")
+    header = (f"{'сценарий':<24}{'p50, с':>9}{'p95, с':>9}{'повтор, с':>11}"
+              f"{'байт/вопр.':>12}{'токенов/вопр.':>15}{'из кэша':>9}")
+    print(header)
+    print('-' * len(header))
+
+    report = {}
+    for name in args.scenarios.split(','):
+        title, options = SCENARIOS[name]
+        rows, prefix_tokens = run_scenario(args.book, book_text, questions, args.backend, args.repeat, **options)
+        summary = summarize(rows)
+        summary['prefix_tokens'] = prefix_tokens
+        report[name] = {'summary': summary, 'rows': rows}
+        print(f"{title:<24}{summary['p50']:>9.3f}{summary['p95']:>9.3f}{summary['repeat_p50']:>11.5f}"
+              f"{summary['prompt_bytes']:>12.0f}{summary['tokens']:>15.0f}{summary['cache_hits']:>9}")
+        if prefix_tokens:
+            print(f"{'':<24}(однократно загружено в кэш контекста ~{prefix_tokens} токенов)")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,19 @@
 import os
+import time
 from dotenv import load_dotenv
-import google.generativeai as genai
+from backends import make_backend
+from session import BookSession
 
 # Загрузка API-ключа из файла .env
 load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")  # Измените название переменной в .env файле
-genai.configure(api_key=api_key)
+
+# Сколько фрагментов книги отправлять модели на каждый вопрос.
+# Больше — точнее ответ, но длиннее промпт; 0 — отправлять всю книгу целиком
+# (тогда книга один раз загружается в кэш контекста модели).
+RETRIEVAL_TOP_K = int(os.getenv("BOOK_TOP_K", "6"))
+ANSWER_CACHE_PATH = "answers.db"
+# Печатать ответ по мере генерации (0 — ждать ответ целиком)
+STREAM_ANSWERS = os.getenv("BOOK_STREAM", "1") != "0"
 
 def read_book(file_path):
     """
@@ -18,30 +26,46 @@ def read_book(file_path):
         print("Файл не найден. Проверьте путь к файлу.")
         return None
 
-def ask_question(book_text, question):
+def ask_question(session, question, lookup=True):
     """
-    Отправляет текст книги и вопрос к модели Gemini для получения ответа.
+    Задаёт вопрос по книге через сессию модели.
+    Возвращает пару (ответ, получен_из_кэша).
     """
     try:
-        # Создаем модель
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Формируем промпт
-        prompt = f"""Ты помощник, который отвечает на вопросы по тексту книги.
-
-Текст книги:
-{book_text}
-
-Вопрос: {question}
-
-Пожалуйста, ответь на вопрос, основываясь только на содержании предоставленной книги."""
-
-        response = model.generate_content(prompt)
-        return response.text
-        
+        return session.ask(question, lookup)
     except Exception as e:
         print(f"Ошибка при запросе к API: {e}")
-        return None
+        return None, False
+
+def stream_answer(session, question):
+    """
+    Печатает ответ по мере генерации и сообщает время до первого фрагмента
+    и общее время. Если поток не удалось начать, делает обычный запрос.
+    """
+    start = time.perf_counter()
+    first_chunk = None
+    parts = []
+    try:
+        for part in session.ask_stream(question):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+                print("\nОтвет: ", end='', flush=True)
+            print(part, end='', flush=True)
+            parts.append(part)
+    except Exception as e:
+        if not parts:
+            print(f"Потоковый режим недоступен ({e}), выполняю обычный запрос...")
+            # Кэш уже проверен в ask_stream: ответа там нет
+            answer, cached = ask_question(session, question, lookup=False)
+            if answer:
+                print(f"\nОтвет{' (из кэша)' if cached else ''}: {answer}")
+            return answer
+        print(f"\nОтвет прерван: {e}")
+
+    if parts:
+        total = time.perf_counter() - start
+        print(f"\n\n(первый фрагмент: {first_chunk:.2f} с, всего: {total:.2f} с)")
+    return ''.join(parts) or None
 
 def main():
     # Укажите путь к файлу с книгой
@@ -50,20 +74,33 @@ def main():
 
     if book_text:
         print("Книга успешно загружена!")
+        # Переменная BOOK_QA_BACKEND=mock или local позволяет работать без сети
+        session = BookSession(book_path, book_text, make_backend(), RETRIEVAL_TOP_K, ANSWER_CACHE_PATH)
+        if session.index:
+            print(f"Индекс готов: {len(session.index.chunks)} фрагментов, в промпт идут {RETRIEVAL_TOP_K} лучших.")
+        elif session.prefix_cached:
+            print("Текст книги загружен в кэш контекста модели.")
         print("Модель Gemini готова к работе!")
         
-        while True:
-            question = input("\nВведите ваш вопрос (или 'выход' для завершения): ")
-            if question.lower() == 'выход':
-                break
+        try:
+            while True:
+                question = input("\nВведите ваш вопрос (или 'выход' для завершения): ")
+                if question.lower() == 'выход':
+                    break
+
+                print("Обрабатываю запрос...")
+                if STREAM_ANSWERS:
+                    answer = stream_answer(session, question)
+                else:
+                    answer, cached = ask_question(session, question)
+                    if answer:
+                        print(f"\nОтвет{' (из кэша)' if cached else ''}: {answer}")
                 
-            print("Обрабатываю запрос...")
-            answer = ask_question(book_text, question)
-            
-            if answer:
-                print(f"\nОтвет: {answer}")
-            else:
-                print("Не удалось получить ответ. Попробуйте еще раз.")
+                if not answer:
+                    print("Не удалось получить ответ. Попробуйте еще раз.")
+        finally:
+            print(session.cache.stats())
+            session.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import math
+import hashlib
+from collections import Counter, defaultdict
+
+# Настройки индекса
+CHUNK_CHARS = 1500      # примерный размер фрагмента в символах
+CHUNK_OVERLAP = 200     # перекрытие соседних фрагментов
+STEM_LENGTH = 6         # грубый "стемминг": обрезаем слова до N символов
+BM25_K1 = 1.5
+BM25_B = 0.75
+INDEX_VERSION = 1
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def file_hash(file_path):
+    """
+    Возвращает sha256 содержимого файла.
+    """
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def tokenize(text):
+    """
+    Разбивает текст на нормализованные термы (нижний регистр, усечённые окончания).
+    """
+    terms = []
+    for token in TOKEN_RE.findall(text.lower().replace('ё', 'е')):
+        if len(token) < 2 or token.isdigit():
+            continue
+        terms.append(token[:STEM_LENGTH])
+    return terms
+
+
+def split_into_chunks(text, chunk_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """
+    Делит текст на фрагменты и возвращает список смещений (start, end).
+    Границы по возможности переносятся на конец абзаца или предложения.
+    """
+    chunks = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            window = text[start + chunk_chars // 2:end]
+            cut = max(window.rfind('\n'), window.rfind('. '))
+            if cut != -1:
+                end = start + chunk_chars // 2 + cut + 1
+        chunks.append((start, end))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class BM25Index:
+    """
+    Инвертированный индекс BM25 по фрагментам одной книги.
+    """
+
+    def __init__(self, chunks, postings, doc_lengths, book_hash=''):
+        self.chunks = chunks
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.book_hash = book_hash
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, text, book_hash='', chunk_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+        chunks = split_into_chunks(text, chunk_chars, overlap)
+        postings = defaultdict(dict)
+        doc_lengths = []
+        for doc_id, (start, end) in enumerate(chunks):
+            terms = tokenize(text[start:end])
+            doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings[term][doc_id] = tf
+        return cls(chunks, dict(postings), doc_lengths, book_hash)
+
+    def search(self, query, top_k):
+        """
+        Возвращает список (doc_id, score) для top_k лучших фрагментов.
+        """
+        n_docs = len(self.chunks)
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k]
+
+    def passages(self, text, query, top_k):
+        """
+        Возвращает лучшие фрагменты как список (start, end, текст) в порядке следования в книге.
+        """
+        hits = self.search(query, top_k)
+        if not hits:
+            hits = [(doc_id, 0.0) for doc_id in range(min(top_k, len(self.chunks)))]
+        selected = sorted(self.chunks[doc_id] for doc_id, _ in hits)
+        return [(start, end, text[start:end]) for start, end in selected]
+
+    def to_dict(self):
+        return {
+            'version': INDEX_VERSION,
+            'book_hash': self.book_hash,
+            'chunks': self.chunks,
+            'doc_lengths': self.doc_lengths,
+            'postings': {term: list(docs.items()) for term, docs in self.postings.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        chunks = [tuple(c) for c in data['chunks']]
+        postings = {term: dict(docs) for term, docs in data['postings'].items()}
+        return cls(chunks, postings, data['doc_lengths'], data['book_hash'])
+
+
+def index_path_for(book_path):
+    return book_path + '.index.json'
+
+
+def load_or_build_index(book_path, text):
+    """
+    Загружает индекс, сохранённый рядом с книгой, или строит его заново,
+    если файла нет или хэш книги изменился.
+    """
+    book_hash = file_hash(book_path)
+    path = index_path_for(book_path)
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        if data.get('version') == INDEX_VERSION and data.get('book_hash') == book_hash:
+            return BM25Index.from_dict(data)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = BM25Index.build(text, book_hash)
+    try:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(index.to_dict(), file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Не удалось сохранить индекс: {e}")
+    return index
+
+
+def format_passages(passages):
+    """
+    Склеивает фрагменты в контекст для промпта, помечая их смещения в книге.
+    """
+    return "\n\n".join(f"[фрагмент {start}-{end}]\n{chunk.strip()}" for start, end, chunk in passages)
@@ -0,0 +1,85 @@
+from retrieval import load_or_build_index, format_passages, file_hash
+from answer_cache import AnswerCache
+
+PROMPT_PREFIX = """Ты помощник, который отвечает на вопросы по тексту книги.
+
+Текст книги:
+{book_text}
+
+"""
+
+PROMPT_QUESTION = """Вопрос: {question}
+
+Пожалуйста, ответь на вопрос, основываясь только на содержании предоставленной книги."""
+
+
+class BookSession:
+    """
+    Долгоживущая сессия вопросов по одной книге: держит модель, индекс
+    фрагментов и кэш ответов, чтобы не создавать их на каждый вопрос.
+    """
+
+    def __init__(self, book_path, book_text, backend, top_k, cache_path, cache_context=True):
+        self.book_text = book_text
+        self.backend = backend
+        self.top_k = top_k
+        self.index = load_or_build_index(book_path, book_text) if top_k > 0 else None
+        self.book_hash = self.index.book_hash if self.index else file_hash(book_path)
+        self.cache = AnswerCache(cache_path)
+        # Настройки выбора контекста входят в ключ кэша ответов
+        self.context_key = f"top_k={top_k}" if self.index else "full"
+        # Книга целиком загружается в модель один раз, дальше уходит только вопрос
+        self.prefix_cached = False
+        if self.index is None and cache_context:
+            self.prefix_cached = backend.cache_prefix(PROMPT_PREFIX.format(book_text=book_text))
+
+    def select_context(self, question):
+        """
+        Выбирает из книги фрагменты, относящиеся к вопросу.
+        Без индекса возвращает весь текст книги.
+        """
+        if self.index is None:
+            return self.book_text
+        return format_passages(self.index.passages(self.book_text, question, self.top_k))
+
+    def build_prompt(self, question):
+        prompt = PROMPT_QUESTION.format(question=question)
+        if self.prefix_cached:
+            return prompt
+        return PROMPT_PREFIX.format(book_text=self.select_context(question)) + prompt
+
+    def ask(self, question, lookup=True):
+        """
+        Возвращает пару (ответ, получен_из_кэша). lookup=False — кэш уже
+        проверен (например, перед неудавшимся потоковым запросом), второй
+        промах не засчитывается.
+        """
+        if lookup:
+            answer = self.cache.get(self.book_hash, question, self.backend.model_name, self.context_key)
+            if answer:
+                return answer, True
+        answer = self.backend.generate(self.build_prompt(question))
+        if answer:
+            self.cache.put(self.book_hash, question, self.backend.model_name, answer, self.context_key)
+        return answer, False
+
+    def ask_stream(self, question):
+        """
+        Потоковый вариант ask: отдаёт ответ по частям и кладёт его в кэш
+        после получения целиком. Ответ из кэша отдаётся одной частью.
+        """
+        answer = self.cache.get(self.book_hash, question, self.backend.model_name, self.context_key)
+        if answer:
+            yield answer
+            return
+        parts = []
+        for part in self.backend.stream(self.build_prompt(question)):
+            parts.append(part)
+            yield part
+        answer = ''.join(parts)
+        if answer:
+            self.cache.put(self.book_hash, question, self.backend.model_name, answer, self.context_key)
+
+    def close(self):
+        self.cache.close()
+        self.backend.close()
@@ -1,8 +1,13 @@
 # kinopoisk_critic.py
 import os
+import re
+import json
 import time
 import traceback
 from collections import Counter
+from urllib.parse import urljoin
+
+import requests
 
 import tkinter as tk
 from tkinter import scrolledtext, messagebox, filedialog
@@ -27,6 +32,37 @@ AUTO_HEADLESS = False   # False — браузер виден. True — скры
 CLICK_MORE_ATTEMPTS = 6
 SCROLL_PAUSE = 1.0
 WAIT_TIMEOUT = 12
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/141.0.7390.108 Safari/537.36")
+HTTP_TIMEOUT = 15
+# Разбор через html.parser: на битой разметке lxml строит другое дерево и
+# находит другие отзывы, а сверки с ним для отзывов нет
+HTML_PARSER = "html.parser"
+# Со статической страницы меньше стольких отзывов — скорее всего, остальные
+# подгружает скрипт; тогда открываем браузер
+MIN_HTTP_REVIEWS = 3
+HTTP_MAX_PAGES = 5      # сколько страниц отзывов пройти по ссылкам rel="next"
+CAPTCHA_MARKERS = ("showcaptcha", "smartcaptcha", "captcha-page", "checkbox-captcha")
+# Узлы встроенных данных, которые считаются отзывом (@type в JSON-LD, __typename в GraphQL)
+REVIEW_TYPES = ("Review", "UserReview")
+REVIEW_TEXT_KEYS = ("reviewBody", "text", "body", "content", "description")
+# Разметка отзыва на странице, от самой точной к менее точной; без браузера
+# берутся только такие элементы, а не любые абзацы
+REVIEW_CLASS_MARKERS = ("review", "responseitem")
+REVIEW_ATTRS = [
+    {"itemprop": "reviewBody"},
+    {"data-test-id": lambda v: v and "review" in v.lower()},
+    {"data-qa": lambda v: v and "review" in v.lower()},
+    {"class": lambda v: v and any(marker in v.lower() for marker in REVIEW_CLASS_MARKERS)},
+]
+
+# Чем были получены отзывы
+SOURCE_LABELS = {
+    "json": "HTTP, данные страницы (JSON)",
+    "html": "HTTP, HTML страницы",
+    "browser": "браузер (Selenium)",
+    None: "—",
+}
 
 # ---------- WebDriver ----------
 def build_driver(headless=AUTO_HEADLESS):
@@ -36,8 +72,7 @@ def build_driver(headless=AUTO_HEADLESS):
     opts.add_argument("--no-sandbox")
     opts.add_argument("--disable-dev-shm-usage")
     opts.add_argument("--disable-gpu")
-    opts.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
-                      "(KHTML, like Gecko) Chrome/141.0.7390.108 Safari/537.36")
+    opts.add_argument(f"user-agent={USER_AGENT}")
     service = Service(ChromeDriverManager().install())
     driver = webdriver.Chrome(service=service, options=opts)
     driver.set_page_load_timeout(30)
@@ -88,7 +123,7 @@ def expand_page(driver):
         pass
 
 def extract_reviews_from_html(html):
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, HTML_PARSER)
     results = []
 
     selectors = [
@@ -126,6 +161,9 @@ def extract_reviews_from_html(html):
         if len(text) >= 30:
             results.append(text)
 
+    return clean_reviews(results)
+
+def clean_reviews(results):
     cleaned = []
     seen = set()
     for r in results:
@@ -140,7 +178,162 @@ def extract_reviews_from_html(html):
 
     return cleaned
 
+# ---------- Быстрый путь: без браузера ----------
+def extract_review_blocks(soup):
+    """
+    Тексты элементов, размеченных как отзыв (REVIEW_ATTRS): берётся первый
+    вид разметки, который есть на странице, а из вложенных друг в друга
+    элементов — самые внутренние, чтобы список отзывов не стал одним отзывом.
+    """
+    for attrs in REVIEW_ATTRS:
+        found = soup.find_all(True, attrs=attrs)
+        if not found:
+            continue
+        marked = {id(tag) for tag in found}
+        results = [tag.get_text(separator="\n").strip() for tag in found
+                   if not any(id(inner) in marked for inner in tag.find_all(True))]
+        texts = clean_reviews(results)
+        if texts:
+            return texts
+    return []
+
+def find_state_json(html):
+    """
+    Данные, которые сайт встраивает в страницу: JSON-LD, __NEXT_DATA__ и
+    присваивания вида window.__APOLLO_STATE__ = {...}.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    states = []
+    for script in soup.find_all("script"):
+        code = script.string or ""
+        kind = (script.get("type") or "").lower()
+        try:
+            if kind in ("application/ld+json", "application/json"):
+                states.append(json.loads(code))
+                continue
+            for match in re.finditer(r"window\.__[A-Z_]+__\s*=\s*", code):
+                value, _ = json.JSONDecoder().raw_decode(code, match.end())
+                states.append(value)
+        except ValueError:
+            continue
+    return states
+
+def is_review_node(node):
+    kind = node.get("@type") or node.get("__typename") or ""
+    kinds = kind if isinstance(kind, list) else [kind]
+    return any(k in REVIEW_TYPES for k in kinds)
+
+def collect_state_reviews(node, results):
+    """
+    Один текст с каждого узла-отзыва: первое поле из REVIEW_TEXT_KEYS. Поля
+    вложенных узлов (автор, фильм с его description) отзывом не считаются.
+    """
+    if isinstance(node, list):
+        for item in node:
+            collect_state_reviews(item, results)
+    elif isinstance(node, dict):
+        if is_review_node(node):
+            text = next((node[k] for k in REVIEW_TEXT_KEYS if isinstance(node.get(k), str)), None)
+            if text:
+                # Текст отзыва бывает с HTML-разметкой
+                results.append(BeautifulSoup(text, HTML_PARSER).get_text(separator="\n") if "<" in text else text)
+        for value in node.values():
+            collect_state_reviews(value, results)
+
+def extract_reviews_from_state(html):
+    results = []
+    for state in find_state_json(html):
+        collect_state_reviews(state, results)
+    return clean_reviews(results)
+
+def fetch_html(url):
+    """
+    Загружает страницу обычным запросом. Возвращает (html, адрес после
+    перенаправлений) или (None, None), если это не HTML или капча.
+    """
+    resp = requests.get(url, headers={"User-Agent": USER_AGENT, "Accept-Language": "ru-RU,ru;q=0.9"},
+                        timeout=HTTP_TIMEOUT)
+    resp.raise_for_status()
+    content_type = resp.headers.get("Content-Type", "text/html")
+    if "html" not in content_type:
+        return None, None
+    if "charset" not in content_type.lower():
+        # Иначе requests считает страницу ISO-8859-1 и кириллица превращается в мусор
+        resp.encoding = resp.apparent_encoding
+    html = resp.text
+    lowered = (resp.url + html[:20000]).lower()
+    if any(marker in lowered for marker in CAPTCHA_MARKERS):
+        return None, None
+    return html, resp.url
+
+def reviews_from_page(soup, html, minimum):
+    """
+    Отзывы одной страницы из встроенных данных, иначе из разметки отзывов.
+    Меньше minimum — ([], None): для обоих источников это признак, что
+    отзывы подгружает скрипт.
+    """
+    texts = extract_reviews_from_state(html)
+    if len(texts) >= minimum:
+        return texts, "json"
+    texts = extract_review_blocks(soup)
+    if len(texts) >= minimum:
+        return texts, "html"
+    return [], None
+
+def next_page_url(soup, base_url):
+    link = soup.find(["link", "a"], rel="next", href=True)
+    return urljoin(base_url, link["href"]) if link else None
+
+def fetch_reviews_http(url):
+    """
+    Достаёт отзывы обычными запросами: с первой страницы и следующих по
+    ссылкам rel="next" (не больше HTTP_MAX_PAGES). Возвращает (отзывы,
+    источник) или ([], None), если так отзывы не получить.
+    """
+    texts, source = [], None
+    visited = set()
+    while url and url not in visited and len(visited) < HTTP_MAX_PAGES:
+        visited.add(url)
+        try:
+            html, final_url = fetch_html(url)
+        except Exception as e:
+            if not texts:
+                raise
+            # Уже собранное с прошлых страниц не теряем
+            print(f"Не удалось загрузить следующую страницу отзывов {url}: {type(e).__name__}: {e}")
+            break
+        if html is None:
+            break
+        soup = BeautifulSoup(html, HTML_PARSER)
+        # Порог — для первой страницы; на последней отзывов бывает и меньше
+        page_texts, page_source = reviews_from_page(soup, html, MIN_HTTP_REVIEWS if not texts else 1)
+        if not page_texts:
+            break
+        texts.extend(page_texts)
+        source = source or page_source
+        url = next_page_url(soup, final_url)
+    texts = clean_reviews(texts)
+    return (texts, source) if texts else ([], None)
+
 def fetch_reviews_from_url(url, debug_save_dir=None, headless=AUTO_HEADLESS):
+    """
+    Сначала пробует обычный HTTP-запрос и запускает браузер, только если так
+    отзывы не нашлись. Возвращает (отзывы, debug-файл, источник, секунд).
+    """
+    started = time.perf_counter()
+    try:
+        texts, source = fetch_reviews_http(url)
+    except Exception as e:
+        print(f"Без браузера отзывы не получены ({type(e).__name__}: {e}), открываю браузер")
+        texts, source = [], None
+    debug_path = None
+    if not texts:
+        texts, debug_path = fetch_reviews_with_browser(url, debug_save_dir, headless)
+        source = "browser" if texts else None
+    return texts, debug_path, source, time.perf_counter() - started
+
+# ---------- Медленный путь: браузер ----------
+def fetch_reviews_with_browser(url, debug_save_dir=None, headless=AUTO_HEADLESS):
     driver = build_driver(headless=headless)
     texts = []
     debug_path = None
@@ -297,11 +490,13 @@ class App:
         self.root.update_idletasks()
 
         try:
-            texts, debug_path = fetch_reviews_from_url(url, debug_save_dir=os.getcwd(), headless=AUTO_HEADLESS)
+            texts, debug_path, source, seconds = fetch_reviews_from_url(url, debug_save_dir=os.getcwd(),
+                                                                        headless=AUTO_HEADLESS)
+            print(f"{url}: {len(texts)} отзывов за {seconds:.1f} с, источник: {SOURCE_LABELS[source]}")
             if not texts:
                 self.reviews_box.delete("1.0", tk.END)
                 self.reviews_box.insert(tk.END, f"Отзывы не найдены.\nDebug: {debug_path}")
-                self.status_var.set("Готово — не найдено")
+                self.status_var.set(f"Готово — не найдено ({seconds:.1f} с)")
                 return
 
             self.reviews_box.delete("1.0", tk.END)
@@ -354,7 +549,7 @@ class App:
                 color = "orange"
 
             self.rec_label.config(text=f"Итоговая рекомендация: {verdict}", fg=color)
-            self.status_var.set(f"Анализ завершён: {total} отзывов")
+            self.status_var.set(f"Анализ завершён: {total} отзывов за {seconds:.1f} с, источник: {SOURCE_LABELS[source]}")
         finally:
             self.analyze_btn.config(state="normal")
 
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import kad
+from kad import execute_ai_plan, article_filename, http_summary, HostLimiter, CircuitBreaker, USE_CACHE, ARTICLE_DEADLINE, SEARCH_BURST, TRACE_FORMAT
+from tracing import Tracer, TRACE_FORMATS
+
+# Настройки пакетного режима
+DEFAULT_CONCURRENCY = 4         # статей одновременно; у каждой свой пул загрузки страниц
+DEFAULT_SEARCH_RATE = 1.0       # запросов к Google CSE в секунду на все статьи вместе
+SUMMARY_NAME = 'summary.json'
+
+
+def read_topics(path):
+    """
+    Темы по одной на строку; пустые строки, строки с # и повторы пропускаются.
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        topics = [line.strip() for line in file]
+    return list(dict.fromkeys(t for t in topics if t and not t.startswith('#')))
+
+
+def output_names(topics):
+    """
+    Имена файлов для тем: если начало темы (article_filename) совпадает с
+    другой темой, к имени добавляется короткий хеш темы, чтобы статьи не
+    перезаписывали друг друга.
+    """
+    names = [article_filename(topic) for topic in topics]
+    # Регистр не различается: на Windows и macOS это один и тот же файл
+    counts = Counter(name.lower() for name in names)
+    return [f"{name}-{hashlib.sha1(topic.encode('utf-8')).hexdigest()[:8]}" if counts[name.lower()] > 1 else name
+            for name, topic in zip(names, topics)]
+
+
+def run_batch(topics, out_dir, concurrency=DEFAULT_CONCURRENCY, use_cache=USE_CACHE,
+              deadline_seconds=ARTICLE_DEADLINE, verbose=False, trace_format=TRACE_FORMAT):
+    """
+    Готовит статьи параллельно и возвращает сводку с результатом и временем
+    по каждой теме. Запросы HTTP и обращения к кэшу подсчитываются за весь
+    запуск: по статьям их не разделить, когда статьи идут одновременно.
+    """
+    started = time.perf_counter()
+    http_before = kad.HTTP.stats()
+    names = output_names(topics)
+    # Один ограничитель на все статьи: к сайту, который нужен нескольким темам, не ходим чаще обычного
+    limiter = HostLimiter()
+    # Размыкатель — на этот запуск: неотвечающий сайт пропускают все статьи, но не следующие запуски
+    breaker = CircuitBreaker()
+    print_lock = threading.Lock()
+
+    def say(message):
+        with print_lock:
+            print(message, flush=True)
+
+    def work(index, topic):
+        prefix = f"[{index + 1}/{len(topics)}]"
+        log_fn = (lambda *args: say(f"{prefix} {' '.join(str(a) for a in args)}")) if verbose else (lambda *args: None)
+        t0 = time.perf_counter()
+        record = {'index': index, 'topic': topic}
+        tracer = Tracer()
+        try:
+            out_path = execute_ai_plan(topic, log_fn=log_fn, use_cache=use_cache, deadline_seconds=deadline_seconds,
+                                       out_dir=out_dir, limiter=limiter, tracer=tracer, trace_format=trace_format,
+                                       breaker=breaker, out_name=names[index], log_http=False)
+            record.update(status='ok', file=out_path)
+        except Exception as e:
+            record.update(status='error', file=None, error=f"{type(e).__name__}: {e}")
+        record['seconds'] = round(time.perf_counter() - t0, 3)
+        record['stages'] = tracer.totals()
+        if record['status'] == 'ok':
+            say(f"{prefix} {topic}: {record['seconds']:.1f} с → {record['file']}")
+        else:
+            say(f"{prefix} {topic}: ошибка за {record['seconds']:.1f} с — {record['error']}")
+        return record
+
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(work, i, topic) for i, topic in enumerate(topics)]
+        for future in as_completed(futures):
+            results.append(future.result())
+    results.sort(key=lambda r: r['index'])
+
+    seconds = [r['seconds'] for r in results]
+    return {
+        'topics': len(topics),
+        'ok': sum(1 for r in results if r['status'] == 'ok'),
+        'failed': sum(1 for r in results if r['status'] != 'ok'),
+        'concurrency': concurrency,
+        'search_rate': kad.SEARCH_QUOTA.rate,
+        'total_seconds': round(time.perf_counter() - started, 3),
+        'max_topic_seconds': max(seconds, default=0),
+        'http': http_summary(http_before, kad.HTTP.stats()),
+        'cache': kad.CACHE.stats(),
+        'results': results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная подготовка статей КАД без графического интерфейса.")
+    parser.add_argument('topics', help="файл с темами, по одной на строку")
+    parser.add_argument('-o', '--out-dir', default='.', help="каталог для .docx и сводки")
+    parser.add_argument('-j', '--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="статей одновременно")
+    parser.add_argument('--search-rate', type=float, default=kad.SEARCH_RATE or DEFAULT_SEARCH_RATE,
+                        help="запросов к Google CSE в секунду на все статьи, 0 — без ограничения")
+    parser.add_argument('--search-burst', type=int, default=SEARCH_BURST, help="сколько запросов к Google CSE подряд")
+    parser.add_argument('--deadline', type=float, default=ARTICLE_DEADLINE, help="секунд на одну статью, 0 — без ограничения")
+    parser.add_argument('--no-cache', action='store_true', help="загружать заново, не читая кэш")
+    parser.add_argument('--trace', choices=TRACE_FORMATS, default=TRACE_FORMAT or None,
+                        help="сохранять трассировку каждой статьи рядом с .docx")
+    parser.add_argument('--summary', default=None, help=f"куда записать сводку JSON (по умолчанию {SUMMARY_NAME} в --out-dir)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="выводить подробный лог каждой статьи")
+    args = parser.parse_args(argv)
+
+    topics = read_topics(args.topics)
+    if not topics:
+        print(f"В {args.topics} нет тем")
+        return 1
+    os.makedirs(args.out_dir, exist_ok=True)
+    kad.set_search_rate(args.search_rate, args.search_burst)
+    print(f"Тем: {len(topics)}, одновременно: {args.concurrency}, "
+          f"Google CSE: {args.search_rate or 'без ограничения'} запр/с, каталог: {os.path.abspath(args.out_dir)}")
+
+    try:
+        summary = run_batch(topics, args.out_dir, args.concurrency, use_cache=not args.no_cache,
+                            deadline_seconds=args.deadline, verbose=args.verbose, trace_format=args.trace)
+    finally:
+        kad.HTTP.close()
+        kad.CACHE.close()
+
+    summary_path = args.summary or os.path.join(args.out_dir, SUMMARY_NAME)
+    with open(summary_path, 'w', encoding='utf-8') as file:
+        json.dump(summary, file, ensure_ascii=False, indent=2)
+    print(f"Готово: {summary['ok']} из {summary['topics']} за {summary['total_seconds']:.1f} с, "
+          f"ошибок: {summary['failed']}. Сводка: {summary_path}")
+    print(summary['http'])
+    print(summary['cache'])
+    return 0 if not summary['failed'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import glob
+import time
+import difflib
+import argparse
+
+from extract import EXTRACTORS, CHUNK_BYTES, extract_text_stream
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+REFERENCE = 'bs4'   # прежний извлекатель, с ним сравниваем результат
+
+
+def load_fixtures(path):
+    files = sorted(glob.glob(os.path.join(path, '**', '*.htm*'), recursive=True))
+    pages = []
+    for name in files:
+        with open(name, 'rb') as file:
+            pages.append((os.path.relpath(name, path), file.read()))
+    return pages
+
+
+def run_engine(engine, pages, max_chars, repeat):
+    """
+    Извлекает текст из всех страниц repeat раз так же, как при загрузке:
+    кусками по CHUNK_BYTES, с остановкой, когда текста достаточно.
+    """
+    outputs = []
+    read = 0
+    start = time.perf_counter()
+    for run in range(repeat):
+        for _, raw in pages:
+            chunks = (raw[i:i + CHUNK_BYTES] for i in range(0, len(raw), CHUNK_BYTES))
+            text, received = extract_text_stream(chunks, max_chars=max_chars, engine=engine)
+            if run == 0:
+                outputs.append(text)
+                read += received
+    seconds = time.perf_counter() - start
+    return outputs, seconds, read
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Скорость и совпадение результата движков извлечения текста из HTML.")
+    parser.add_argument('fixtures', nargs='?', default=FIXTURES_DIR, help="каталог с сохранёнными страницами")
+    parser.add_argument('--engines', default=','.join(EXTRACTORS), help="список движков через запятую")
+    parser.add_argument('--repeat', type=int, default=20, help="сколько раз прогнать набор")
+    parser.add_argument('--max-chars', type=int, default=4000, help="сколько текста брать со страницы")
+    parser.add_argument('--diff', action='store_true', help="показать начало расхождений с эталоном")
+    parser.add_argument('--json', default=None, help="сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    pages = load_fixtures(args.fixtures)
+    if not pages:
+        print(f"В {args.fixtures} нет страниц (*.html)")
+        return 1
+    total_bytes = sum(len(raw) for _, raw in pages)
+    print(f"Страниц: {len(pages)} ({total_bytes / 1024:.0f} КБ), повторов: {args.repeat}, max_chars: {args.max_chars}")
+
+    engines = args.engines.split(',')
+    # Эталон прогоняется столько же раз, сколько остальные: от его скорости считается ускорение
+    reference, reference_seconds, _ = run_engine(REFERENCE, pages, args.max_chars, args.repeat)
+    header = f"{'движок':<12}{'стр/с':>10}{'МБ/с':>8}{'к bs4':>8}{'прочитано':>11}{'совпало':>10}{'сходство':>10}"
+    print(header)
+    print('-' * len(header))
+
+    report = {}
+    for engine in engines:
+        if engine not in EXTRACTORS:
+            print(f"{engine:<12}не установлен")
+            continue
+        outputs, seconds, read = run_engine(engine, pages, args.max_chars, args.repeat)
+        same = sum(1 for a, b in zip(reference, outputs) if a == b)
+        similarity = sum(difflib.SequenceMatcher(None, a, b).ratio() if a != b else 1.0
+                         for a, b in zip(reference, outputs)) / len(pages)
+        pages_per_second = len(pages) * args.repeat / seconds
+        report[engine] = {
+            'pages_per_second': pages_per_second,
+            'mb_per_second': total_bytes * args.repeat / seconds / 1e6,
+            'speedup': reference_seconds / seconds,
+            'read_share': read / total_bytes,
+            'same': same,
+            'similarity': similarity,
+            'mismatches': [name for (name, _), a, b in zip(pages, reference, outputs) if a != b],
+        }
+        print(f"{engine:<12}{pages_per_second:>10.1f}{report[engine]['mb_per_second']:>8.2f}"
+              f"{report[engine]['speedup']:>7.1f}x{read / total_bytes:>10.0%}{same:>7}/{len(pages):<3}{similarity:>9.1%}")
+        if args.diff:
+            for (name, _), a, b in zip(pages, reference, outputs):
+                if a != b:
+                    i = next((i for i, (x, y) in enumerate(zip(a, b)) if x != y), min(len(a), len(b)))
+                    print(f"    {name}: эталон …{a[max(0, i - 40):i + 40]!r}, {engine} …{b[max(0, i - 40):i + 40]!r}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
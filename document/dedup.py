@@ -0,0 +1,89 @@
+import re
+import random
+import hashlib
+
+# Настройки поиска почти одинаковых абзацев
+SHINGLE_WORDS = 3           # длина шингла в словах
+NUM_HASHES = 32             # длина подписи MinHash
+BANDS = 8                   # полос LSH; NUM_HASHES / BANDS строк в полосе
+SIMILARITY_THRESHOLD = 0.7  # оценка сходства Жаккара, начиная с которой абзац считается повтором
+PASSAGE_CHARS = 300         # текст страниц режется на абзацы примерно такой длины
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+
+# Маски для семейства хеш-функций h_i(x) = h(x) XOR mask_i; фиксированное зерно — одинаковый результат между запусками
+_MASKS = [random.Random(i).getrandbits(64) for i in range(NUM_HASHES)]
+
+
+def split_passages(text: str, size: int = PASSAGE_CHARS) -> list:
+    """
+    Режет сплошной текст страницы на абзацы по границам предложений.
+    """
+    passages = []
+    current = ''
+    for sentence in SENTENCE_END_RE.split(text):
+        current = f"{current} {sentence}" if current else sentence
+        if len(current) >= size:
+            passages.append(current)
+            current = ''
+    if current:
+        passages.append(current)
+    return passages
+
+
+def shingles(text: str, k: int = SHINGLE_WORDS) -> set:
+    words = [w.lower().replace('ё', 'е') for w in WORD_RE.findall(text)]
+    if len(words) < k:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def minhash(items: set) -> tuple:
+    hashes = [int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big') for item in items]
+    return tuple(min(h ^ mask for h in hashes) for mask in _MASKS)
+
+
+class NearDuplicateIndex:
+    """
+    Запоминает подписи MinHash уже принятых абзацев и по полосам LSH
+    быстро находит среди них похожие на новый.
+    """
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, bands: int = BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = NUM_HASHES // bands
+        self.buckets = {}
+        self.signatures = []
+
+    def _band_keys(self, signature):
+        return [(b, signature[b * self.rows:(b + 1) * self.rows]) for b in range(self.bands)]
+
+    def is_duplicate(self, signature) -> bool:
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self.buckets.get(key, ()))
+        for i in candidates:
+            same = sum(1 for a, b in zip(signature, self.signatures[i]) if a == b)
+            if same / NUM_HASHES >= self.threshold:
+                return True
+        return False
+
+    def add(self, signature):
+        index = len(self.signatures)
+        self.signatures.append(signature)
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, []).append(index)
+
+    def add_if_new(self, text: str) -> bool:
+        """
+        True, если абзац новый (и теперь запомнен), False — если он повторяет уже принятый.
+        """
+        items = shingles(text)
+        if not items:
+            return False
+        signature = minhash(items)
+        if self.is_duplicate(signature):
+            return False
+        self.add(signature)
+        return True
@@ -0,0 +1,318 @@
+import os
+import re
+import codecs
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# Настройки извлечения текста
+SKIP_TAGS = {'script', 'style', 'nav', 'footer', 'header', 'form', 'aside', 'noscript'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+CONTENT_TAGS = ('main', 'article')          # в порядке предпочтения, как soup.find('main') or soup.find('article')
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain')
+MAX_PAGE_BYTES = 2 * 1024 * 1024            # больше этого со страницы не скачиваем
+CHUNK_BYTES = 16 * 1024
+# Если на странице пока нет <main>/<article>, читаем её текст с запасом, а потом останавливаемся
+PAGE_TEXT_FACTOR = 4
+
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?\s*([\w.:-]+)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+
+def parse_content_type(header: str):
+    """
+    "text/html; charset=windows-1251" -> ("text/html", "windows-1251").
+    """
+    mime, _, params = header.partition(';')
+    charset = None
+    for param in params.split(';'):
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            charset = value.strip().strip('"\'') or None
+    return mime.strip().lower(), charset
+
+
+def is_html_type(mime: str) -> bool:
+    # Без заголовка Content-Type решаем по содержимому
+    return not mime or mime in HTML_CONTENT_TYPES
+
+
+def sniff_encoding(head: bytes, charset: str = None) -> str:
+    """
+    Кодировка из заголовка, BOM или <meta charset>, иначе UTF-8.
+    """
+    candidates = [charset]
+    if head.startswith(codecs.BOM_UTF8):
+        candidates.insert(0, 'utf-8-sig')
+    match = META_CHARSET_RE.search(head[:4096])
+    if match:
+        candidates.append(match.group(1).decode('ascii', 'ignore'))
+    for name in candidates:
+        if not name:
+            continue
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            continue
+    return 'utf-8'
+
+
+class TextCollector:
+    """
+    Собирает текст так же, как BeautifulSoup со stripped_strings после
+    удаления SKIP_TAGS (содержимое <main>, иначе <article>, иначе всей
+    страницы), но по событиям парсера, по мере поступления данных, и
+    сообщает через done, что текста уже достаточно. Как soup.find, берётся
+    только первый <main>/<article> вне SKIP_TAGS. Методы совпадают с
+    интерфейсом target у парсеров lxml.
+    """
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.skip_depth = 0
+        self.stack = []
+        self.open = dict.fromkeys(CONTENT_TAGS, 0)
+        self.seen = set()
+        self.parts = {name: [] for name in CONTENT_TAGS + ('page',)}
+        self.lengths = dict.fromkeys(self.parts, 0)
+        self.pending = []
+
+    def start(self, tag, attrib=None):
+        self._flush()
+        if tag in VOID_TAGS:
+            return
+        # В стеке вместе с тегом запоминаем, учтён ли он в open
+        counted = False
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in self.open and not self.skip_depth and (tag not in self.seen or self.open[tag]):
+            # Первый такой тег вне SKIP_TAGS или вложенный в него; следующие после него не берутся
+            self.open[tag] += 1
+            self.seen.add(tag)
+            counted = True
+        self.stack.append((tag, counted))
+
+    def end(self, tag):
+        self._flush()
+        # Как BeautifulSoup: закрывающий тег закрывает и все незакрытые внутри него,
+        # а закрывающий тег без открывающего пропускается
+        if not any(name == tag for name, _ in self.stack):
+            return
+        while self.stack:
+            closed, counted = self.stack.pop()
+            if closed in SKIP_TAGS:
+                self.skip_depth -= 1
+            elif counted:
+                self.open[closed] -= 1
+            if closed == tag:
+                break
+
+    def comment(self, text):
+        self._flush()
+
+    def data(self, data):
+        # Текст между тегами может прийти в нескольких кусках, склеиваем до следующего тега
+        if not self.skip_depth:
+            self.pending.append(data)
+
+    def close(self):
+        self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+        data = SPACE_RE.sub(' ', ''.join(self.pending)).strip()
+        self.pending = []
+        if not data:
+            return
+        for name in CONTENT_TAGS:
+            if self.open[name]:
+                self._add(name, data)
+        self._add('page', data)
+
+    def _add(self, name, data):
+        # Больше max_chars из одного источника всё равно не понадобится
+        if self.lengths[name] <= self.max_chars * (PAGE_TEXT_FACTOR if name == 'page' else 1):
+            self.parts[name].append(data)
+            self.lengths[name] += len(data) + 1
+
+    @property
+    def done(self) -> bool:
+        # lengths учитывает и пробел после последнего куска, поэтому сравнение строгое
+        if self.lengths['main'] > self.max_chars:
+            return True
+        if 'main' not in self.seen and self.lengths['article'] > self.max_chars:
+            return True
+        return not self.seen and self.lengths['page'] > self.max_chars * PAGE_TEXT_FACTOR
+
+    def text(self) -> str:
+        name = next((tag for tag in CONTENT_TAGS if tag in self.seen), 'page')
+        return SPACE_RE.sub(' ', ' '.join(self.parts[name])).strip()[:self.max_chars]
+
+
+# --- Движки извлечения ---
+# У каждого: feed(кусок текста), close(), done (текста уже достаточно), text()
+
+class StdlibExtractor(HTMLParser):
+    """
+    Потоковый разбор стандартным html.parser, без внешних зависимостей.
+    """
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.collector = TextCollector(max_chars)
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag)
+
+    def handle_endtag(self, tag):
+        self.collector.end(tag)
+
+    def handle_comment(self, data):
+        self.collector.comment(data)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+    def close(self):
+        super().close()
+        self.collector.close()
+
+    @property
+    def done(self):
+        return self.collector.done
+
+    def text(self):
+        return self.collector.text()
+
+
+class LxmlExtractor:
+    """
+    Потоковый разбор парсером libxml2: те же события, что у html.parser,
+    но токенизация на C.
+    """
+    def __init__(self, max_chars: int):
+        self.collector = TextCollector(max_chars)
+        self.parser = etree.HTMLParser(target=self.collector)
+
+    def feed(self, data):
+        self.parser.feed(data)
+
+    def close(self):
+        try:
+            self.parser.close()
+        except etree.XMLSyntaxError:
+            # Пустой или оборванный документ: что успели собрать, то и возвращаем
+            self.collector.close()
+
+    @property
+    def done(self):
+        return self.collector.done
+
+    def text(self):
+        return self.collector.text()
+
+
+class BufferedExtractor:
+    """
+    Основа для движков, которым нужен весь документ сразу: накапливает
+    текст и разбирает его в close().
+    """
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.chunks = []
+        self.result = ''
+        self.done = False
+
+    def feed(self, data):
+        self.chunks.append(data)
+
+    def close(self):
+        self.result = SPACE_RE.sub(' ', self.extract(''.join(self.chunks))).strip()[:self.max_chars]
+
+    def text(self):
+        return self.result
+
+
+class SoupExtractor(BufferedExtractor):
+    """
+    Прежний способ: BeautifulSoup с html.parser. Эталон для сравнения.
+    """
+    def extract(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        for tag in soup(list(SKIP_TAGS)):
+            tag.decompose()
+        main = soup.find('main') or soup.find('article') or soup
+        return ' '.join(main.stripped_strings)
+
+
+class SelectolaxExtractor(BufferedExtractor):
+    """
+    Разбор парсером lexbor: весь документ, но очень быстро.
+    """
+    def extract(self, html):
+        tree = LexborHTMLParser(html)
+        for node in tree.css(','.join(sorted(SKIP_TAGS))):
+            node.decompose()
+        main = tree.css_first('main') or tree.css_first('article') or tree.root
+        return main.text(separator=' ', strip=True) if main is not None else ''
+
+
+EXTRACTORS = {'stream': StdlibExtractor, 'bs4': SoupExtractor}
+if etree is not None:
+    EXTRACTORS['lxml'] = LxmlExtractor
+if LexborHTMLParser is not None:
+    EXTRACTORS['selectolax'] = SelectolaxExtractor
+# KAD_EXTRACTOR выбирает движок явно; по умолчанию — самый быстрый потоковый из доступных
+DEFAULT_EXTRACTOR = os.environ.get('KAD_EXTRACTOR') or ('lxml' if etree is not None else 'stream')
+
+
+def make_extractor(max_chars: int, engine: str = None):
+    engine = engine or DEFAULT_EXTRACTOR
+    if engine not in EXTRACTORS:
+        raise ValueError(f"Неизвестный движок извлечения '{engine}', доступны: {', '.join(EXTRACTORS)}")
+    return EXTRACTORS[engine](max_chars)
+
+
+def extract_text(html: str, max_chars: int = 4000, engine: str = None) -> str:
+    """
+    Текст уже загруженной страницы целиком.
+    """
+    extractor = make_extractor(max_chars, engine)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+def extract_text_stream(chunks, charset: str = None, max_chars: int = 4000, max_bytes: int = MAX_PAGE_BYTES,
+                        engine: str = None):
+    """
+    Декодирует и разбирает страницу по кускам, пока не наберётся max_chars
+    чистого текста или не будет прочитано max_bytes.
+    Возвращает (текст, сколько байт прочитано).
+    """
+    extractor = make_extractor(max_chars, engine)
+    decoder = None
+    received = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if decoder is None:
+            if chunk.startswith(b'%PDF'):
+                raise ValueError("пропущено: документ PDF")
+            decoder = codecs.getincrementaldecoder(sniff_encoding(chunk, charset))(errors='replace')
+        received += len(chunk)
+        extractor.feed(decoder.decode(chunk))
+        if extractor.done or received >= max_bytes:
+            break
+    if decoder is not None:
+        extractor.feed(decoder.decode(b'', final=True))
+    extractor.close()
+    return extractor.text(), received
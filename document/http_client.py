@@ -0,0 +1,162 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Настройки пула соединений
+POOL_HOSTS = int(os.environ.get('KAD_POOL_HOSTS', '32'))        # сколько хостов держать открытыми
+POOL_SIZE_PER_HOST = int(os.environ.get('KAD_POOL_SIZE', '10'))  # соединений на один хост
+USE_HTTP2 = os.environ.get('KAD_HTTP2', '0') == '1'             # HTTP/2 через httpx, если он установлен
+
+
+class _HttpxResponse:
+    """
+    Ответ httpx с интерфейсом requests (iter_content), чтобы код приложения
+    не зависел от того, каким клиентом выполнен запрос.
+    """
+    def __init__(self, response):
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    @property
+    def ok(self):
+        return self._response.is_success
+
+    def iter_content(self, chunk_size=8192):
+        return self._response.iter_bytes(chunk_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._response.close()
+
+
+class _CountingAdapter(HTTPAdapter):
+    """
+    Адаптер requests, который сообщает on_connect о каждом новом соединении.
+    Считать по живым пулам нельзя: пулы хостов сверх pool_hosts закрываются
+    и выпадают из подсчёта.
+    """
+    def __init__(self, on_connect, **kwargs):
+        self.on_connect = on_connect
+        super().__init__(**kwargs)
+
+    def _counting_pools(self):
+        on_connect = self.on_connect
+        classes = {}
+        for scheme, base in (('http', HTTPConnectionPool), ('https', HTTPSConnectionPool)):
+            def _new_conn(pool, _base=base):
+                on_connect()
+                return _base._new_conn(pool)
+            classes[scheme] = type(f"Counting{base.__name__}", (base,), {'_new_conn': _new_conn})
+        return classes
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._counting_pools()
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = self._counting_pools()
+        return manager
+
+
+class HttpClient:
+    """
+    Общий HTTP-клиент для всех сетевых запросов: соединения с каждым хостом
+    держатся открытыми и переиспользуются, так что DNS, TCP и TLS
+    выполняются один раз на хост, а не на каждый запрос. Если задан
+    breaker (retry.CircuitBreaker) — общий в конструкторе или свой в get, —
+    сбои каждого сайта учитываются, и к сайту, который раз за разом не
+    отвечает, запросы временно не отправляются.
+    """
+    def __init__(self, headers: dict = None, pool_hosts: int = POOL_HOSTS,
+                 pool_size: int = POOL_SIZE_PER_HOST, http2: bool = USE_HTTP2, breaker=None):
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._new_connections = 0
+        self.http2 = False
+        self._client = None
+        if http2 and httpx is not None:
+            try:
+                self._client = httpx.Client(
+                    http2=True, headers=headers, follow_redirects=True,
+                    limits=httpx.Limits(max_connections=pool_hosts * pool_size,
+                                        max_keepalive_connections=pool_hosts * pool_size),
+                )
+                self.http2 = True
+            except ImportError as e:
+                # httpx без пакета h2
+                print(f"HTTP/2 недоступен ({e}), используется HTTP/1.1")
+        if self._client is None:
+            self.session = requests.Session()
+            if headers:
+                self.session.headers.update(headers)
+            adapter = _CountingAdapter(self._connected, pool_connections=pool_hosts, pool_maxsize=pool_size)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+    def get(self, url: str, params: dict = None, headers: dict = None, timeout: float = 15, stream: bool = False,
+            breaker=None):
+        breaker = breaker or self.breaker
+        if breaker is not None:
+            breaker.before(url)
+        with self._lock:
+            self._requests += 1
+        try:
+            if not self.http2:
+                response = self.session.get(url, params=params, headers=headers, timeout=timeout, stream=stream)
+            else:
+                request = self._client.build_request('GET', url, params=params, headers=headers, timeout=timeout,
+                                                     extensions={'trace': self._trace})
+                response = _HttpxResponse(self._client.send(request, stream=stream))
+        except Exception:
+            if breaker is not None:
+                breaker.failure(url)
+            raise
+        if breaker is not None:
+            # 5xx — сбой; 4xx — ответ сайта по существу, сайт работает. 429 не
+            # считается ни тем, ни другим: это просьба подождать, её выполняет повтор по Retry-After
+            if response.status_code >= 500:
+                breaker.failure(url)
+            elif response.status_code != 429:
+                breaker.success(url)
+        return response
+
+    def _trace(self, event, info):
+        if event == 'connection.connect_tcp.complete':
+            self._connected()
+
+    def _connected(self):
+        with self._lock:
+            self._new_connections += 1
+
+    def stats(self) -> dict:
+        """
+        Сколько запросов выполнено и сколько из них ушло по уже открытому соединению.
+        """
+        with self._lock:
+            requests_count = self._requests
+            connections = self._new_connections
+        return {
+            'requests': requests_count,
+            'connections': connections,
+            'reused': max(0, requests_count - connections),
+            'http2': self.http2,
+        }
+
+    def close(self):
+        if self.http2:
+            self._client.close()
+        else:
+            self.session.close()
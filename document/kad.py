@@ -0,0 +1,627 @@
+import os
+import re
+import io
+import time
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from contextlib import contextmanager, nullcontext
+from urllib.parse import urlparse
+from PIL import Image
+from docx import Document
+from docx.shared import Pt, Inches
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from dotenv import load_dotenv
+from pathlib import Path
+from http_client import HttpClient
+from retry import exponential_backoff, CircuitBreaker, Deadline
+from web_cache import WebCache
+from dedup import NearDuplicateIndex, split_passages
+from extract import extract_text_stream, parse_content_type, is_html_type, CHUNK_BYTES
+from tracing import Tracer, TimedChunks, span
+
+# Загружаем .env при запуске
+load_dotenv(Path(__file__).resolve().parent / ".env")
+
+# Настройки
+GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
+GOOGLE_CX = os.environ.get('GOOGLE_CX')
+GOOGLE_SEARCH_URL = 'https://www.googleapis.com/customsearch/v1'
+MAX_RESULTS = 5
+IMAGE_MAX_WIDTH_INCHES = 4
+IMAGE_DPI = 150                 # разрешение печати: шире IMAGE_MAX_WIDTH_INCHES * IMAGE_DPI точек не храним
+IMAGE_JPEG_QUALITY = 85
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+REQUEST_HEADERS = {"User-Agent": "Mozilla/5.0 (KAD-Bot/1.0)"}
+MAX_COLLECTED_CHARS = 30000    # текста на всю статью; делится поровну между разделами
+PAGE_MAX_CHARS = 4000           # текста с одной страницы
+SPARE_FETCHES = 1               # сколько страниц раздела загружать про запас сверх нужного
+MAX_PARALLEL_FETCHES = 8        # одновременных загрузок страниц всего
+PER_HOST_FETCHES = 2            # одновременных загрузок с одного сайта
+HOST_DELAY = 0.2                # пауза между запросами к одному сайту, с
+CACHE_PATH = os.environ.get('KAD_CACHE_PATH', str(Path(__file__).resolve().parent / "kad_cache.db"))
+USE_CACHE = os.environ.get('KAD_CACHE', '1') != '0'   # 0 — всегда загружать заново
+ARTICLE_DEADLINE = float(os.environ.get('KAD_DEADLINE', '120'))   # секунд на одну статью, 0 — без ограничения
+SEARCH_RATE = float(os.environ.get('KAD_SEARCH_RATE', '0'))       # запросов к Google CSE в секунду, 0 — без ограничения
+SEARCH_BURST = 5                # сколько запросов к Google CSE можно сделать подряд
+TRACE_FORMAT = os.environ.get('KAD_TRACE', '')   # json или chrome — сохранять трассировку рядом с .docx
+
+# Общий клиент с пулом соединений для всех сетевых запросов. Размыкатель для
+# сайтов, которые раз за разом не отвечают, у каждой статьи свой (execute_ai_plan);
+# к Google CSE он не применяется: там сбои и 429 обрабатывают повторы и SEARCH_QUOTA
+HTTP = HttpClient(REQUEST_HEADERS)
+# Кэш выдачи поиска и текста страниц между запусками
+CACHE = WebCache(CACHE_PATH)
+
+# Вспомогательные функции
+def sanitize_filename(name: str) -> str:
+    return re.sub(r'[\\/*:?"<>|]', '_', name.strip())
+
+def article_filename(prompt: str) -> str:
+    return sanitize_filename(prompt[:40]) or 'article'
+
+class HostLimiter:
+    """
+    Вежливость к сайтам: не больше per_host одновременных запросов к одному
+    хосту и не чаще одного запроса в delay секунд.
+    """
+    def __init__(self, per_host=PER_HOST_FETCHES, delay=HOST_DELAY):
+        self.per_host = per_host
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_time = {}
+
+    @contextmanager
+    def hold(self, url: str, deadline: Deadline = None):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            slot = self._slots.setdefault(host, threading.Semaphore(self.per_host))
+        with slot:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_time.get(host, now))
+                self._next_time[host] = start + self.delay
+            time.sleep(start - now)
+            if deadline is not None:
+                deadline.check()
+            yield
+
+class TokenBucket:
+    """
+    Потокобезопасный ограничитель частоты: rate токенов в секунду, не больше
+    burst подряд. При rate=0 ничего не ограничивает.
+    """
+    def __init__(self, rate: float = 0, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: Deadline = None):
+        while self.rate > 0:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None:
+                wait = min(wait, max(0.0, deadline.remaining()))
+                deadline.check()
+            time.sleep(wait)
+
+class PageFetcher:
+    """
+    Загружает страницы в общем пуле: каждую не больше одного раза за статью,
+    даже если она нужна нескольким разделам, и отменяет загрузку, когда
+    страница больше не нужна ни одному из них.
+    """
+    def __init__(self, pool, fetch_fn):
+        self.pool = pool
+        self.fetch_fn = fetch_fn
+        self._lock = threading.Lock()
+        self._pages = {}    # url -> [future, событие отмены, сколько разделов ждут]
+        self.cancelled = 0
+
+    def request(self, url: str, heading: str):
+        with self._lock:
+            entry = self._pages.get(url)
+            if entry is None or entry[1].is_set():
+                cancel = threading.Event()
+                entry = self._pages[url] = [self.pool.submit(self.fetch_fn, heading, url, cancel), cancel, 0]
+            entry[2] += 1
+            return entry[0]
+
+    def release(self, url: str):
+        with self._lock:
+            entry = self._pages[url]
+            entry[2] -= 1
+            if entry[2] == 0 and not entry[0].done():
+                entry[1].set()
+                entry[0].cancel()
+                self.cancelled += 1
+
+    @property
+    def requested(self) -> int:
+        return len(self._pages)
+
+# Google Search
+# use_cache=False не читает кэш, но сохраняет в него свежий результат.
+# Квота Google CSE общая для всех статей, которые готовятся одновременно; ответы из кэша её не тратят
+SEARCH_QUOTA = TokenBucket(SEARCH_RATE, SEARCH_BURST)
+
+def set_search_rate(rate: float, burst: int = SEARCH_BURST):
+    global SEARCH_QUOTA
+    SEARCH_QUOTA = TokenBucket(rate, burst)
+
+@exponential_backoff()
+def google_search(query: str, num_results: int = MAX_RESULTS, use_cache: bool = True, deadline: Deadline = None,
+                  tracer: Tracer = None) -> list:
+    with span(tracer, 'search', query=query, kind='web', cache_hit=False) as fields:
+        cache_key = f"{min(num_results, 10)}:{query}"
+        cached = CACHE.get('search', cache_key) if use_cache else None
+        if cached and cached['fresh']:
+            fields['cache_hit'] = True
+            return cached['value']
+        if not GOOGLE_API_KEY or not GOOGLE_CX:
+            raise RuntimeError("GOOGLE_API_KEY и GOOGLE_CX должны быть заданы")
+        waited = time.perf_counter()
+        SEARCH_QUOTA.acquire(deadline)
+        fields['wait'] = time.perf_counter() - waited
+        params = {'key': GOOGLE_API_KEY, 'cx': GOOGLE_CX, 'q': query, 'num': min(num_results, 10)}
+        resp = HTTP.get(GOOGLE_SEARCH_URL, params=params, timeout=(deadline or Deadline()).timeout(15))
+        fields['bytes'] = len(resp.content)
+        resp.raise_for_status()
+        data = resp.json()
+        results = [{'title': i.get('title', ''), 'snippet': i.get('snippet', ''), 'link': i.get('link', '')} for i in data.get('items', [])]
+        CACHE.put('search', cache_key, results)
+        return results
+
+@exponential_backoff()
+def google_search_image_url(query: str, use_cache: bool = True, deadline: Deadline = None,
+                            tracer: Tracer = None) -> str:
+    with span(tracer, 'search', query=query, kind='image', cache_hit=False) as fields:
+        cached = CACHE.get('image', query) if use_cache else None
+        if cached and cached['fresh']:
+            fields['cache_hit'] = True
+            return cached['value']
+        if not GOOGLE_API_KEY or not GOOGLE_CX:
+            raise RuntimeError("GOOGLE_API_KEY и GOOGLE_CX должны быть заданы")
+        params = {
+            'key': GOOGLE_API_KEY,
+            'cx': GOOGLE_CX,
+            'q': query,
+            'searchType': 'image',
+            'num': 1,
+            'imgSize': 'medium',  # Попробуем использовать фильтр по размеру изображения
+        }
+        waited = time.perf_counter()
+        SEARCH_QUOTA.acquire(deadline)
+        fields['wait'] = time.perf_counter() - waited
+        resp = HTTP.get(GOOGLE_SEARCH_URL, params=params, timeout=(deadline or Deadline()).timeout(15))
+        fields['bytes'] = len(resp.content)
+        resp.raise_for_status()
+        items = resp.json().get('items', [])
+        link = items[0].get('link', '') if items else ''
+        CACHE.put('image', query, link)
+        return link
+
+# Извлечение текста
+FETCH_ERROR_PREFIX = "(Ошибка при загрузке"
+
+class FetchCancelled(Exception):
+    pass
+
+def until_cancelled(chunks, cancel: threading.Event):
+    for chunk in chunks:
+        if cancel.is_set():
+            raise FetchCancelled("загрузка отменена")
+        yield chunk
+
+@exponential_backoff()
+def fetch_page_text(url: str, max_chars: int, cached: dict = None, limiter=None,
+                    cancel: threading.Event = None, deadline: Deadline = None, tracer: Tracer = None,
+                    breaker: CircuitBreaker = None):
+    """
+    Загружает страницу и возвращает (текст, ETag, Last-Modified); для
+    устаревшей записи кэша (cached) сначала спрашивает сервер, изменилась ли
+    страница, и при 304 возвращает None. Ошибки пробрасываются, чтобы
+    временные можно было повторить.
+    """
+    headers = {}
+    if cached and cached['etag']:
+        headers['If-None-Match'] = cached['etag']
+    if cached and cached['last_modified']:
+        headers['If-Modified-Since'] = cached['last_modified']
+    start = time.perf_counter()
+    fields = {'url': url, 'cache_hit': False, 'bytes': 0}
+    parse_seconds = 0.0
+    try:
+        # Ограничение по сайту действует только на настоящие запросы, не на попадания в кэш
+        with limiter.hold(url, deadline) if limiter else nullcontext():
+            fields['wait'] = time.perf_counter() - start
+            if cancel is not None and cancel.is_set():
+                raise FetchCancelled("загрузка отменена")
+            resp = HTTP.get(url, headers=headers or None, timeout=(deadline or Deadline()).timeout(12), stream=True,
+                            breaker=breaker)
+        # Страница читается по кускам и не дальше, чем нужно для max_chars текста
+        with resp:
+            if cached and resp.status_code == 304:
+                fields['cache_hit'] = True
+                return None
+            resp.raise_for_status()
+            mime, charset = parse_content_type(resp.headers.get('Content-Type', ''))
+            if not is_html_type(mime):
+                raise ValueError(f"пропущено: тип содержимого {mime}")
+            chunks = TimedChunks(resp.iter_content(CHUNK_BYTES))
+            parse_start = time.perf_counter()
+            try:
+                text, _ = extract_text_stream(until_cancelled(chunks, cancel) if cancel is not None else chunks,
+                                              charset, max_chars)
+            finally:
+                # Загрузка и разбор чередуются по кускам: разбору относим всё, кроме ожидания сети
+                parse_seconds = time.perf_counter() - parse_start - chunks.seconds
+                fields['bytes'] = chunks.bytes
+        fields['chars'] = len(text)
+        return text, resp.headers.get('ETag'), resp.headers.get('Last-Modified')
+    except Exception as e:
+        fields['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if tracer is not None:
+            network = time.perf_counter() - start - parse_seconds
+            tracer.add('fetch', start, network, **fields)
+            if parse_seconds:
+                tracer.add('parse', start + network, parse_seconds, url=url, bytes=fields['bytes'])
+
+def extract_text_from_url(url: str, max_chars: int = PAGE_MAX_CHARS, use_cache: bool = True, limiter=None,
+                          cancel: threading.Event = None, deadline: Deadline = None, tracer: Tracer = None,
+                          breaker: CircuitBreaker = None) -> str:
+    cache_key = f"{max_chars}:{url}"
+    start = time.perf_counter()
+    cached = CACHE.get('page', cache_key) if use_cache else None
+    if cached and cached['fresh']:
+        if tracer is not None:
+            tracer.add('fetch', start, time.perf_counter() - start, url=url, cache_hit=True, bytes=0)
+        return cached['value']
+    try:
+        fetched = fetch_page_text(url, max_chars, cached, limiter=limiter, cancel=cancel, deadline=deadline,
+                                  tracer=tracer, breaker=breaker)
+    except Exception as e:
+        return f"{FETCH_ERROR_PREFIX} {url}: {e})"
+    if fetched is None:
+        CACHE.refresh('page', cache_key)
+        return cached['value']
+    text, etag, last_modified = fetched
+    CACHE.put('page', cache_key, text, etag, last_modified)
+    return text
+
+# Изображение
+class ImageProcessingError(Exception):
+    pass
+
+@exponential_backoff(max_attempts=2)
+def download_image(url: str, max_bytes: int = MAX_IMAGE_BYTES, deadline: Deadline = None,
+                   breaker: CircuitBreaker = None) -> bytes:
+    with HTTP.get(url, timeout=(deadline or Deadline()).timeout(15), stream=True, breaker=breaker) as resp:
+        resp.raise_for_status()
+        mime, _ = parse_content_type(resp.headers.get('Content-Type', ''))
+        if mime and not mime.startswith('image/'):
+            raise ValueError(f"по ссылке не изображение, а {mime}")
+        length = resp.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > max_bytes:
+            raise ValueError(f"изображение больше {max_bytes // (1024 * 1024)} МБ")
+        data = bytearray()
+        for chunk in resp.iter_content(64 * 1024):
+            data += chunk
+            if len(data) > max_bytes:
+                raise ValueError(f"изображение больше {max_bytes // (1024 * 1024)} МБ")
+    return bytes(data)
+
+def prepare_image(data: bytes, width_inches: float = IMAGE_MAX_WIDTH_INCHES, dpi: int = IMAGE_DPI) -> io.BytesIO:
+    """
+    Уменьшает изображение до ширины, нужной для печати, и пережимает в JPEG в памяти.
+    """
+    img = Image.open(io.BytesIO(data))
+    max_width = int(width_inches * dpi)
+    if img.width > max_width:
+        # Для JPEG уменьшение начинается уже при декодировании
+        img.draft('RGB', (max_width, max(1, img.height * max_width // img.width)))
+    img.load()
+    if img.width > max_width:
+        img = img.resize((max_width, max(1, round(img.height * max_width / img.width))), Image.LANCZOS)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        # Прозрачность в JPEG не сохраняется: подкладываем белый фон
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, 'white')
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+    elif img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    out = io.BytesIO()
+    img.save(out, 'JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True, dpi=(dpi, dpi))
+    out.seek(0)
+    return out
+
+def load_image(url: str, deadline: Deadline = None, tracer: Tracer = None,
+               breaker: CircuitBreaker = None) -> io.BytesIO:
+    with span(tracer, 'image', url=url) as fields:
+        data = download_image(url, deadline=deadline, breaker=breaker)
+        fields['bytes'] = len(data)
+        try:
+            image = prepare_image(data)
+        except Exception as e:
+            raise ImageProcessingError(e) from e
+        fields['jpeg_bytes'] = image.getbuffer().nbytes
+        return image
+
+# Создание docx
+def apply_paragraph_style(paragraph, text, bold=False, alignment=WD_PARAGRAPH_ALIGNMENT.LEFT):
+    run = paragraph.add_run(text)
+    run.bold = bold
+    run.font.name = 'Times New Roman'
+    run.font.size = Pt(14)
+    paragraph.paragraph_format.line_spacing = 1.5
+    paragraph.alignment = alignment
+    return run
+
+def build_docx(title: str, sections: list, sources: list, image_url: str, out_path: str, image: io.BytesIO = None,
+               tracer: Tracer = None, image_error: Exception = None):
+    with span(tracer, 'save', path=out_path) as fields:
+        _build_docx(title, sections, sources, image_url, out_path, image, image_error)
+        fields['bytes'] = os.path.getsize(out_path)
+
+def _build_docx(title, sections, sources, image_url, out_path, image, image_error):
+    doc = Document()
+    # Заголовок
+    p = doc.add_paragraph()
+    r = p.add_run(title)
+    r.bold = True
+    r.font.size = Pt(16)
+    r.font.name = 'Times New Roman'
+    p.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+    doc.add_paragraph()
+    
+    # Содержание
+    for heading, body in sections:
+        h = doc.add_paragraph()
+        apply_paragraph_style(h, heading, bold=True)
+        b = doc.add_paragraph()
+        apply_paragraph_style(b, body)
+        doc.add_paragraph()
+
+    # Источники
+    s_head = doc.add_paragraph()
+    apply_paragraph_style(s_head, 'Источники:', bold=True)
+    for src in sources:
+        p = doc.add_paragraph()
+        apply_paragraph_style(p, src)
+    
+    # Изображение: уже подготовленное (image) или загружаемое здесь по image_url;
+    # если его не удалось загрузить заранее (image_error), об этом остаётся пометка в документе
+    if image is None and image_error is not None:
+        if isinstance(image_error, ImageProcessingError):
+            doc.add_paragraph(f"(Ошибка при обработке изображения: {image_error})")
+        else:
+            doc.add_paragraph(f"(Не удалось загрузить изображение: {image_error})")
+    elif image is not None or image_url:
+        try:
+            img_data = download_image(image_url) if image is None else None
+            try:
+                img_stream = image if image is not None else prepare_image(img_data)
+
+                # Вставляем изображение в документ
+                doc.add_page_break()
+                pic = doc.add_picture(img_stream, width=Inches(IMAGE_MAX_WIDTH_INCHES))
+                doc.paragraphs[-1].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+
+            except Exception as img_err:
+                doc.add_paragraph(f"(Ошибка при обработке изображения: {img_err})")
+
+        except Exception as e:
+            doc.add_paragraph(f"(Не удалось загрузить изображение: {e})")
+
+    doc.save(out_path)
+
+# Основная логика
+def http_summary(before: dict, after: dict) -> str:
+    requests_made = after['requests'] - before['requests']
+    connections = after['connections'] - before['connections']
+    return (f"HTTP{'/2' if after['http2'] else ''}: запросов {requests_made}, новых соединений {connections}, "
+            f"по открытым соединениям {max(0, requests_made - connections)}")
+
+def execute_ai_plan(prompt: str, log_fn=print, use_cache: bool = USE_CACHE,
+                    deadline_seconds: float = ARTICLE_DEADLINE, out_dir: str = None,
+                    limiter: HostLimiter = None, tracer: Tracer = None, trace_format: str = TRACE_FORMAT,
+                    breaker: CircuitBreaker = None, out_name: str = None, log_http: bool = True) -> str:
+    """
+    Собирает статью по теме prompt и сохраняет её в out_dir (по умолчанию в
+    текущий каталог) под именем out_name (по умолчанию — начало темы). Статьи, которые готовятся одновременно, могут делить
+    один limiter, чтобы не нагружать общие сайты, и один breaker, чтобы
+    вместе пропускать неотвечающие; без breaker у статьи свой размыкатель,
+    и сбои прошлых статей на неё не влияют. Время этапов записывается
+    в tracer; при trace_format (json или chrome) трассировка сохраняется
+    рядом с документом. Счётчики HTTP и кэша общие на процесс, поэтому при
+    одновременных статьях log_http=False, а итог выводит вызывающий.
+    """
+    log_fn("Поиск информации в интернете...")
+    deadline = Deadline(deadline_seconds)
+    tracer = tracer or Tracer()
+    http_before = HTTP.stats()
+    sections = []
+    sources = []
+    image_url = ''
+    
+    # Определяем шаблон разделов в зависимости от типа объекта
+    character_keywords = ["мультфильм", "аниме", "сериал", "игра", "персонаж", "герой"]
+    if any(word.lower() in prompt.lower() for word in character_keywords):
+        queries = {
+            "Описание": f"{prompt} персонаж описание",
+            "Характер": f"{prompt} персонаж черты характера",
+            "Сюжет/Роль": f"{prompt} персонаж сюжет роль",
+            "Интересные факты": f"{prompt} персонаж интересные факты"
+        }
+    else:
+        # Шаблон для реальных людей
+        queries = {
+            "Биография (рождение и детство, дата рождения, смерть)": f"Биография {prompt}",
+            "Деятельность": f"Деятельность {prompt}",
+            "Труды/работы": f"Труды {prompt}",
+            "Вклад в историю": f"Вклад в историю {prompt}"
+        }
+
+    # Поиски по разделам и загрузка страниц идут параллельно; результаты
+    # собираются в порядке разделов и выдачи, поэтому документ не зависит от того,
+    # какая страница загрузилась первой
+    limiter = limiter or HostLimiter()
+    breaker = breaker or CircuitBreaker()
+
+    section_budget = MAX_COLLECTED_CHARS // len(queries)
+
+    def fetch(heading, url, cancel):
+        text = extract_text_from_url(url, use_cache=use_cache, limiter=limiter, cancel=cancel, deadline=deadline,
+                                     tracer=tracer, breaker=breaker)
+        if not cancel.is_set():
+            log_fn(f" → {heading}: загружен текст с {url}")
+        return text
+
+    def load_ranked(urls, heading, budget):
+        """
+        Загружает страницы urls по порядку ранга, пока не наберётся budget
+        символов: одновременно в работе столько страниц, сколько нужно для
+        остатка бюджета, плюс SPARE_FETCHES. Лишние загрузки отменяются.
+        Возвращает [(url, текст)] в порядке выдачи и адреса, которые не
+        понадобились, — тоже по порядку.
+        """
+        pages = []
+        in_flight = []
+        next_rank = 0
+        collected = 0
+        while collected < budget and deadline.remaining() > 0:
+            needed = math.ceil((budget - collected) / PAGE_MAX_CHARS) + SPARE_FETCHES
+            while len(in_flight) < needed and next_rank < len(urls):
+                in_flight.append((urls[next_rank], fetcher.request(urls[next_rank], heading)))
+                next_rank += 1
+            if not in_flight:
+                break
+            url, future = in_flight.pop(0)
+            try:
+                text = future.result()
+            except CancelledError:
+                continue
+            fetcher.release(url)
+            pages.append((url, text))
+            if not text.startswith(FETCH_ERROR_PREFIX):
+                collected += len(text)
+        for url, _ in in_flight:
+            fetcher.release(url)
+        return pages, [url for url, _ in in_flight] + urls[next_rank:]
+
+    def collect_section(heading, query):
+        urls = [r['link'] for r in google_search(query, use_cache=use_cache, deadline=deadline, tracer=tracer)]
+        return load_ranked(urls, heading, section_budget)
+
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_FETCHES) as fetch_pool, \
+            ThreadPoolExecutor(max_workers=len(queries) + 2) as search_pool:
+        fetcher = PageFetcher(fetch_pool, fetch)
+        # Изображение ищется, загружается и уменьшается одновременно с загрузкой текста
+        image_search = search_pool.submit(google_search_image_url, f"фото {prompt}", use_cache=use_cache,
+                                          deadline=deadline, tracer=tracer)
+
+        def fetch_image():
+            url = image_search.result()
+            return load_image(url, deadline=deadline, tracer=tracer, breaker=breaker) if url else None
+
+        image_future = search_pool.submit(fetch_image)
+        searches = [(heading, query, search_pool.submit(collect_section, heading, query))
+                    for heading, query in queries.items()]
+        # Страница попадает только в первый раздел, где встретилась, а абзацы,
+        # почти повторяющие уже взятые в статью, отбрасываются
+        used_urls = set()
+        paragraphs = NearDuplicateIndex()
+        dropped = 0
+        search_errors = []
+        for heading, query, search in searches:
+            try:
+                pages, rest = search.result()
+            except Exception as e:
+                log_fn(f"Ошибка поиска '{query}': {e}")
+                search_errors.append(e)
+                sections.append((heading, ''))
+                continue
+            parts = []
+            section_chars = 0
+            while True:
+                for url, text in pages:
+                    if url in used_urls or section_chars >= section_budget:
+                        continue
+                    used_urls.add(url)
+                    kept = []
+                    for passage in split_passages(text):
+                        if section_chars >= section_budget:
+                            break
+                        if paragraphs.add_if_new(passage):
+                            kept.append(passage)
+                            section_chars += len(passage)
+                        else:
+                            dropped += 1
+                    if kept:
+                        parts.append(' '.join(kept))
+                        sources.append(url)
+                # Страницы, которые уже взяли предыдущие разделы, и повторы абзацев бюджет
+                # не заполняют: догружаем следующие по выдаче страницы, ещё не взятые в статью
+                rest = [url for url in rest if url not in used_urls]
+                if section_chars >= section_budget or not rest or deadline.remaining() <= 0:
+                    break
+                pages, rest = load_ranked(rest, heading, section_budget - section_chars)
+            sections.append((heading, "\n\n".join(parts)))
+        # Ни один поиск не удался (нет ключа, исчерпана квота, нет сети): пустую статью не собираем
+        if len(search_errors) == len(searches):
+            image_search.cancel()
+            image_future.cancel()
+            raise RuntimeError(f"Не удалось выполнить поиск: {search_errors[0]}") from search_errors[0]
+        log_fn(f"Загружено страниц: {fetcher.requested - fetcher.cancelled} (отменено {fetcher.cancelled}), "
+               f"повторяющихся абзацев убрано: {dropped}")
+        if deadline.remaining() <= 0:
+            log_fn(f"Время на статью ({deadline_seconds:.0f} с) истекло, собрано то, что успели загрузить")
+        skipped_hosts = breaker.open_hosts()
+        if skipped_hosts:
+            log_fn(f"Временно пропускаются сайты: {', '.join(skipped_hosts)}")
+
+        # Поиск изображения
+        try:
+            image_url = image_search.result()
+            log_fn(f"Найдено изображение: {image_url}")
+        except Exception as e:
+            log_fn(f"Ошибка поиска изображения: {e}")
+        image = None
+        image_error = None
+        if image_url:
+            try:
+                image = image_future.result()
+            except Exception as e:
+                log_fn(f"Не удалось загрузить изображение: {e}")
+                image_error = e
+
+    # Введение
+    intro_text = f"Статья по теме: {prompt}\nИнформация собрана из открытых источников."
+    sections.insert(0, ('Главная', intro_text))
+
+    # Создать docx
+    out_path = os.path.join(out_dir or os.getcwd(), f"{out_name or article_filename(prompt)}.docx")
+    build_docx(prompt, sections, list(dict.fromkeys(sources)), image_url if image else '', out_path, image,
+               tracer=tracer, image_error=image_error)
+    if log_http:
+        log_fn(http_summary(http_before, HTTP.stats()))
+        log_fn(CACHE.stats())
+    log_fn(tracer.summary())
+    if trace_format:
+        trace_path = f"{os.path.splitext(out_path)[0]}.trace.json"
+        tracer.export(trace_path, trace_format)
+        log_fn(f"Трассировка ({trace_format}): {trace_path}")
+    log_fn(f"Готово! Файл: {out_path}")
+    return out_path
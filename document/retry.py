@@ -0,0 +1,168 @@
+import time
+import random
+import threading
+import functools
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Настройки повторов
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 60            # дольше, чем просит сервер в Retry-After, не ждём — сразу ошибка
+BREAKER_FAILURES = 3            # сбоев подряд, после которых сайт временно пропускается
+BREAKER_COOLDOWN = 60           # на сколько секунд
+
+TRANSIENT_ERRORS = (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError)
+if httpx is not None:
+    TRANSIENT_ERRORS += (httpx.TimeoutException, httpx.TransportError)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class HostUnavailable(Exception):
+    pass
+
+
+class Deadline:
+    """
+    Общий срок на всю статью: повторы и тайм-ауты запросов не выходят за него.
+    """
+    def __init__(self, seconds: float = None):
+        self.expires = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> float:
+        return float('inf') if self.expires is None else self.expires - time.monotonic()
+
+    def check(self):
+        if self.remaining() <= 0:
+            raise DeadlineExceeded("истекло время на подготовку статьи")
+
+    def timeout(self, default: float) -> float:
+        """
+        Тайм-аут запроса, урезанный до оставшегося времени.
+        """
+        self.check()
+        return min(default, self.remaining())
+
+
+def status_of(exc):
+    return getattr(getattr(exc, 'response', None), 'status_code', None)
+
+
+def is_retryable(exc) -> bool:
+    """
+    Повторять имеет смысл только временные сбои: тайм-ауты, обрывы
+    соединения, 429 и 5xx. 400/403/404, отсутствие ключа API и т. п. не
+    пройдут и со второго раза, а временно пропускаемый сайт (HostUnavailable)
+    на то и пропускается, чтобы его не ждать.
+    """
+    if isinstance(exc, (DeadlineExceeded, HostUnavailable)):
+        return False
+    status = status_of(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return isinstance(exc, TRANSIENT_ERRORS)
+
+
+def retry_after(exc):
+    """
+    Сколько секунд просит подождать сервер (Retry-After: секунды или дата), иначе None.
+    """
+    response = getattr(exc, 'response', None)
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def exponential_backoff(max_attempts=4, initial_delay=1.0, factor=2.0, max_delay=20.0):
+    """
+    Повторяет вызов при временных ошибках с экспоненциальной задержкой и
+    случайным разбросом (full jitter) или столько, сколько указал сервер в
+    Retry-After. Если функции передан deadline=Deadline(...), повторы
+    прекращаются, когда ожидание за него выходит.
+    """
+    def deco(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            deadline = kwargs.get('deadline')
+            delay = initial_delay
+            attempt = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    attempt += 1
+                    if attempt >= max_attempts or not is_retryable(e):
+                        raise
+                    wait = retry_after(e)
+                    if wait is None:
+                        wait = random.uniform(0, delay)
+                    elif wait > MAX_RETRY_AFTER:
+                        raise
+                    if deadline is not None and wait >= deadline.remaining():
+                        raise
+                    time.sleep(wait)
+                    delay = min(delay * factor, max_delay)
+        return wrapper
+    return deco
+
+
+class CircuitBreaker:
+    """
+    Размыкатель по сайтам: после BREAKER_FAILURES сбоев подряд запросы к
+    сайту сразу завершаются ошибкой HostUnavailable на BREAKER_COOLDOWN
+    секунд (без повторов), затем пропускается один пробный запрос.
+    Состояние живёт столько же, сколько объект: заводите отдельный
+    размыкатель на статью или на пакетный запуск.
+    """
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._hosts = {}    # host -> [сбоев подряд, до какого времени разомкнут, идёт ли пробный запрос]
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlparse(url).netloc.lower()
+
+    def before(self, url: str):
+        host = self.host(url)
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state[0] < self.failures:
+                return
+            if time.monotonic() < state[1] or state[2]:
+                raise HostUnavailable(f"сайт {host} временно пропускается после {state[0]} сбоев подряд")
+            state[2] = True
+
+    def success(self, url: str):
+        with self._lock:
+            self._hosts.pop(self.host(url), None)
+
+    def failure(self, url: str):
+        host = self.host(url)
+        with self._lock:
+            state = self._hosts.setdefault(host, [0, 0.0, False])
+            state[0] += 1
+            state[2] = False
+            if state[0] >= self.failures:
+                state[1] = time.monotonic() + self.cooldown
+
+    def open_hosts(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return sorted(host for host, state in self._hosts.items() if state[0] >= self.failures and now < state[1])
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Этапы подготовки статьи в порядке вывода в сводке
+STAGES = ('search', 'fetch', 'parse', 'image', 'save')
+TRACE_FORMATS = ('json', 'chrome')
+SLOWEST_SPANS = 5               # сколько самых долгих операций показывать под сводкой
+
+
+class TimedChunks:
+    """
+    Обёртка над потоком кусков ответа: считает время ожидания сети и байты,
+    чтобы отделить загрузку страницы от её разбора.
+    """
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            chunk = next(self.chunks)
+        finally:
+            self.seconds += time.perf_counter() - start
+        self.bytes += len(chunk)
+        return chunk
+
+
+class Tracer:
+    """
+    Собирает операции (spans) одной статьи из всех потоков: этап, время
+    начала и длительность и поля вроде url/query, bytes, cache_hit, error;
+    wait — сколько из этого времени ушло на ожидание ограничителей частоты.
+    """
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans = []
+
+    def add(self, stage: str, start: float, duration: float, **fields) -> dict:
+        record = {'stage': stage, 'start': start - self.origin, 'duration': duration,
+                  'thread': threading.current_thread().name, **fields}
+        with self._lock:
+            self.spans.append(record)
+        return record
+
+    @contextmanager
+    def span(self, stage: str, **fields):
+        """
+        Замеряет блок with; поля можно дополнять через возвращаемый словарь.
+        """
+        start = time.perf_counter()
+        try:
+            yield fields
+        except Exception as e:
+            fields.setdefault('error', f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            self.add(stage, start, time.perf_counter() - start, **fields)
+
+    def totals(self) -> dict:
+        """
+        По каждому этапу: число операций, суммарное и наибольшее время, байты,
+        попадания в кэш и ошибки.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        result = {}
+        for stage in STAGES + tuple(sorted({s['stage'] for s in spans} - set(STAGES))):
+            items = [s for s in spans if s['stage'] == stage]
+            if not items:
+                continue
+            result[stage] = {
+                'count': len(items),
+                'seconds': round(sum(s['duration'] for s in items), 3),
+                'max_seconds': round(max(s['duration'] for s in items), 3),
+                'wait_seconds': round(sum(s.get('wait') or 0 for s in items), 3),
+                'bytes': sum(s.get('bytes') or 0 for s in items),
+                'cache_hits': sum(1 for s in items if s.get('cache_hit')),
+                'errors': sum(1 for s in items if s.get('error')),
+            }
+        return result
+
+    def summary(self) -> str:
+        """
+        Таблица по этапам для лога. Этапы идут параллельно, поэтому их время
+        в сумме обычно больше времени статьи.
+        """
+        wall = time.perf_counter() - self.origin
+        header = f"{'этап':<8}{'шт':>5}{'всего, с':>10}{'макс, с':>9}{'ожид, с':>9}{'КБ':>9}{'кэш':>6}{'ошибок':>8}"
+        lines = [f"Время по этапам (статья целиком: {wall:.2f} с):", header, '-' * len(header)]
+        for stage, t in self.totals().items():
+            lines.append(f"{stage:<8}{t['count']:>5}{t['seconds']:>10.2f}{t['max_seconds']:>9.2f}{t['wait_seconds']:>9.2f}"
+                         f"{t['bytes'] / 1024:>9.0f}{t['cache_hits']:>6}{t['errors']:>8}")
+        with self._lock:
+            slowest = sorted(self.spans, key=lambda s: s['duration'], reverse=True)[:SLOWEST_SPANS]
+        if slowest:
+            lines.append("Самые долгие операции:")
+            for s in slowest:
+                target = s.get('url') or s.get('query') or s.get('path') or ''
+                lines.append(f"  {s['duration']:>6.2f} с  {s['stage']:<7}{target}")
+        return '\n'.join(lines)
+
+    def to_json(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        return {'totals': self.totals(), 'spans': sorted(spans, key=lambda s: s['start'])}
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Формат Trace Event: открывается в chrome://tracing и Perfetto.
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s['start'])
+        pid = os.getpid()
+        threads = {}
+        events = []
+        for s in spans:
+            tid = threads.setdefault(s['thread'], len(threads) + 1)
+            args = {k: v for k, v in s.items() if k not in ('stage', 'start', 'duration', 'thread')}
+            events.append({'name': s['stage'], 'cat': s['stage'], 'ph': 'X', 'pid': pid, 'tid': tid,
+                           'ts': round(s['start'] * 1e6), 'dur': round(s['duration'] * 1e6), 'args': args})
+        for name, tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export(self, path: str, fmt: str = 'json'):
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"Неизвестный формат трассировки '{fmt}', доступны: {', '.join(TRACE_FORMATS)}")
+        data = self.to_chrome_trace() if fmt == 'chrome' else self.to_json()
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=1)
+
+
+@contextmanager
+def span(tracer, stage: str, **fields):
+    """
+    tracer.span(...), если трассировка включена, иначе просто словарь полей.
+    """
+    if tracer is None:
+        yield fields
+        return
+    with tracer.span(stage, **fields) as f:
+        yield f
@@ -0,0 +1,116 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Настройки кэша
+TTL_SECONDS = {
+    'search': 7 * 24 * 3600,     # выдача Custom Search
+    'image': 7 * 24 * 3600,      # ссылка на изображение
+    'page': 24 * 3600,           # текст страницы; после срока проверяется по ETag/Last-Modified
+}
+MAX_BYTES = 200 * 1024 * 1024    # предельный размер записей на диске
+
+
+def make_key(kind: str, key: str) -> str:
+    return hashlib.sha256(f"{kind}\x00{key}".encode('utf-8')).hexdigest()
+
+
+class WebCache:
+    """
+    Кэш ответов поиска и текста страниц в SQLite. Записи старше TTL отдаются
+    как устаревшие (fresh=False) вместе с ETag/Last-Modified, чтобы их можно
+    было проверить условным запросом; при превышении max_bytes удаляются
+    давно не использованные записи.
+    """
+
+    def __init__(self, db_path, max_bytes=MAX_BYTES, ttl=TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.stale = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self.conn.commit()
+        # Размер записей считается один раз, дальше поддерживается при записи и удалении
+        self.total_bytes = self.conn.execute("SELECT coalesce(sum(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, kind: str, key: str):
+        """
+        Возвращает {'value', 'etag', 'last_modified', 'fresh'} или None.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, etag, last_modified, created FROM entries WHERE key = ?",
+                                    (make_key(kind, key),)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE entries SET used = ? WHERE key = ?", (now, make_key(kind, key)))
+            self.conn.commit()
+            fresh = now - row[3] <= self.ttl[kind]
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale += 1
+        return {'value': json.loads(row[0]), 'etag': row[1], 'last_modified': row[2], 'fresh': fresh}
+
+    def put(self, kind: str, key: str, value, etag: str = None, last_modified: str = None):
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode('utf-8'))
+        cache_key = make_key(kind, key)
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM entries WHERE key = ?", (cache_key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO entries (key, kind, value, etag, last_modified, size, created, used) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (cache_key, kind, data, etag, last_modified, size, now, now))
+            self.total_bytes += size - (old[0] if old else 0)
+            self._evict()
+            self.conn.commit()
+
+    def refresh(self, kind: str, key: str):
+        """
+        Сервер подтвердил (304), что запись не изменилась: срок жизни начинается заново.
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute("UPDATE entries SET created = ?, used = ? WHERE key = ?", (now, now, make_key(kind, key)))
+            self.conn.commit()
+            self.revalidated += 1
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        # Удаляем самые давно использованные, пока не уложимся в лимит
+        removed = []
+        for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY used"):
+            if self.total_bytes <= self.max_bytes:
+                break
+            removed.append((key,))
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", removed)
+
+    def stats(self) -> str:
+        return (f"Кэш: попаданий {self.hits}, устаревших {self.stale} (из них подтверждено сервером "
+                f"{self.revalidated}), промахов {self.misses}, на диске {self.total_bytes / 1e6:.1f} МБ")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()